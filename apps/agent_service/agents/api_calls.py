@@ -0,0 +1,105 @@
+# apps/agent_service/agents/api_calls.py
+"""
+Cómo llegan las tools del agente a las consultas de la API.
+
+  • En proceso: si el agente corre dentro de la API (routers/chat.py), la tool
+    ejecuta la misma función de consulta que usa el router
+    (`find_similar_players`, `search_news`…) en el event loop del worker, con
+    su propia AsyncSession. Sin HTTP contra sí mismo, sin conexión nueva y sin
+    codificar/decodificar JSON.
+  • HTTP: si el agente corre en otro proceso (vista de chat del dashboard,
+    scripts) se llama a `API_HOST` con un `requests.Session` keep-alive.
+
+AGENT_TOOLS_MODE = auto | inprocess | http. En `auto` se usa el modo en
+proceso cuando la API ha registrado su event loop (`bind_loop`, en el
+lifespan) y la tool corre en otro hilo (el AgentExecutor se ejecuta en hilos
+con su propio límite, `routers/chat.run_agent`, para no agotar el threadpool
+que necesitan las consultas); si no, HTTP.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+from datetime import datetime
+from typing import Awaitable, Callable, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+API_HOST = os.getenv("API_HOST", "http://api:8001")
+TOOLS_MODE = os.getenv("AGENT_TOOLS_MODE", "auto")
+TOOL_TIMEOUT = 30
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_local = threading.local()
+
+
+def bind_loop(loop: Optional[asyncio.AbstractEventLoop]) -> None:
+    """La API registra (o retira, con None) el event loop donde viven sus pools."""
+    global _loop
+    _loop = loop
+
+
+def _session() -> requests.Session:
+    # una sesión por hilo (requests.Session no es thread-safe), con pool keep-alive
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+        _local.session = session
+    return session
+
+
+def inprocess_available() -> bool:
+    loop = _loop
+    if TOOLS_MODE == "http" or loop is None or not loop.is_running():
+        return False
+    try:
+        asyncio.get_running_loop()          # hilo del loop: esperar aquí lo bloquearía
+    except RuntimeError:
+        return True
+    return False
+
+
+def _iso(value):
+    """Mismo formato que la respuesta JSON de la API (fechas ISO-8601)."""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _as_json_types(data):
+    if isinstance(data, list):
+        return [
+            {k: _iso(v) for k, v in item.items()} if isinstance(item, dict) else item
+            for item in data
+        ]
+    return data
+
+
+async def _with_session(query: Callable[..., Awaitable]):
+    from apps.agent_service.db import AsyncSessionLocal
+
+    async with AsyncSessionLocal() as db:
+        return await query(db)
+
+
+def call(query: Callable[..., Awaitable], path: str, params: dict):
+    """
+    `query(db)` en el loop de la API si estamos dentro de ella; si no,
+    GET `{API_HOST}{path}?params`. Devuelve lo mismo en ambos casos.
+    """
+    if inprocess_available():
+        future = asyncio.run_coroutine_threadsafe(_with_session(query), _loop)
+        try:
+            return _as_json_types(future.result(TOOL_TIMEOUT))
+        except TimeoutError:
+            future.cancel()
+            raise
+    if TOOLS_MODE == "inprocess":
+        raise RuntimeError("AGENT_TOOLS_MODE=inprocess but the API event loop is not bound")
+
+    resp = _session().get(f"{API_HOST}{path}", params=params, timeout=TOOL_TIMEOUT)
+    resp.raise_for_status()
+    return resp.json()
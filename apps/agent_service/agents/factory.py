@@ -1,5 +1,9 @@
+from functools import lru_cache
+
 from langchain.memory import ConversationBufferMemory
-from langchain.agents import initialize_agent , AgentType
+from langchain.agents import AgentExecutor
+from langchain.agents.openai_functions_agent.base import OpenAIFunctionsAgent
+from langchain_core.utils.function_calling import convert_to_openai_function
 from langchain_core.messages import SystemMessage
 from langchain.callbacks.base import BaseCallbackHandler
 from langchain.schema import HumanMessage, AIMessage, SystemMessage
@@ -8,7 +12,6 @@ from apps.agent_service.agents.tools import TOOLS
 from apps.agent_service.llm_provider import get_llm
 from typing import Optional
 import langchain
-from .output_parser import ScoutParser
 from apps.agent_service.memory import SafeConversationMemory
 
  
@@ -61,18 +64,37 @@ SYSTEM = SystemMessage(
     )
 )
 
-def build_agent(
-    user_id: str = "anon",
-    *,
-    messages=None,
-    streaming_callback: BaseCallbackHandler | None = None,
-):
-    llm = get_llm(
-        stream=True,
-        callbacks=[streaming_callback] if streaming_callback else None,
+# esquemas OpenAI de las tools: se calculan una vez, no en cada paso del agente
+@lru_cache(maxsize=1)
+def _tool_functions() -> tuple:
+    return tuple(dict(convert_to_openai_function(t)) for t in TOOLS)
+
+
+class ScoutFunctionsAgent(OpenAIFunctionsAgent):
+    """OpenAIFunctionsAgent con `functions` precalculado (la base lo recalcula por llamada)."""
+
+    @property
+    def functions(self) -> list[dict]:
+        return list(_tool_functions())
+
+
+@lru_cache(maxsize=1)
+def _executor_template() -> AgentExecutor:
+    """
+    Agente + prompt + tools + LLM compartido, construido una sola vez por
+    proceso. No guarda estado de conversación: cada turno hace una copia
+    superficial con su propia memoria (y callbacks).
+    """
+    agent = ScoutFunctionsAgent.from_llm_and_tools(
+        llm=get_llm(stream=True),
+        tools=TOOLS,
+        system_message=SYSTEM,
+        extra_prompt_messages=[MessagesPlaceholder(variable_name="chat_history")],
     )
+    return AgentExecutor.from_agent_and_tools(agent=agent, tools=TOOLS, verbose=True)
+
 
-    # --- memoria ------------------------------------------------------------
+def _memory_from(messages) -> SafeConversationMemory:
     memory = SafeConversationMemory(          
         memory_key="chat_history",
         return_messages=True,
@@ -86,20 +108,26 @@ def build_agent(
                 memory.chat_memory.add_message(HumanMessage(content=m.content))
             else:
                 memory.chat_memory.add_message(AIMessage(content=m.content))
+    return memory
 
-    # --- NUEVO: agent_kwargs con placeholder --------------------------------
-    agent = initialize_agent(
-        tools=TOOLS,
-        llm=llm,
-        agent=AgentType.OPENAI_FUNCTIONS,
-        memory=memory,
-        agent_kwargs={
-            "system_message": SYSTEM,
-            "extra_prompt_messages": [
-                MessagesPlaceholder(variable_name="chat_history")
-            ],
-        },
-        output_parser = ScoutParser(), 
-        verbose=True,
-    )
-    return agent
\ No newline at end of file
+
+def build_agent(
+    user_id: str = "anon",
+    *,
+    messages=None,
+    streaming_callback: BaseCallbackHandler | None = None,
+):
+    """
+    Executor para un turno: copia de la plantilla con la memoria del usuario.
+    El callback de streaming va sólo en el LLM del agente (copia que comparte
+    el cliente HTTP), igual que cuando se construía uno nuevo por petición.
+    """
+    template = _executor_template()
+    update = {"memory": _memory_from(messages)}
+
+    if streaming_callback:
+        agent = template.agent
+        llm = agent.llm.model_copy(update={"callbacks": [streaming_callback]})
+        update["agent"] = agent.model_copy(update={"llm": llm})
+
+    return template.model_copy(update=update)
@@ -1,4 +1,5 @@
-import requests
+from datetime import datetime
+
 from pydantic import BaseModel, Field
 from langchain.tools import StructuredTool
 from apps.agent_service.viz_tools import radar_chart, pizza_chart, radar_comparison_chart, pizza_comparison_chart
@@ -11,6 +12,7 @@ from langchain.prompts import PromptTemplate
 from langchain.chains import LLMChain
 from typing import Optional, Annotated
 from apps.agent_service.llm_provider import get_llm
+from apps.agent_service.agents import api_calls
 
 
 # --------------------------- 1) Similar Players ----------------------------- #
@@ -33,7 +35,7 @@ def _similar_players(
     min_minutes: int = 0,
     max_age: int = 45,
 ) -> List[dict]:
-    """Llama a /players/{id}/similar con los filtros recibidos."""
+    """Jugadores similares (en proceso o vía /players/{id}/similar) con los filtros recibidos."""
     params = dict(
         position=position,
         k=k,
@@ -43,10 +45,19 @@ def _similar_players(
     if exclude_club:
         params["exclude_club"] = exclude_club
 
-    url = f"http://api:8001/players/{player_id}/similar"
-    resp = requests.get(url, params=params, timeout=30)
-    resp.raise_for_status()
-    return resp.json()
+    async def query(db):
+        from apps.agent_service.routers.players import _parse_clubs, find_similar_players
+        return await find_similar_players(
+            db,
+            player_id,
+            k=k,
+            position=position,
+            min_minutes=min_minutes,
+            max_age=max_age,
+            exclude_clubs=_parse_clubs(exclude_club),
+        )
+
+    return api_calls.call(query, f"/players/{player_id}/similar", params)
 
 similar_players_tool = StructuredTool.from_function(
     name="similar_players",
@@ -67,11 +78,14 @@ class PlayerLookupInput(BaseModel):
     limit: int = Field(5, description="Cuántos resultados devolver")
 
 def _player_lookup(name: str, position: str = "MF", limit: int = 5) -> List[dict]:
-    """Llama a /players/players/search y devuelve los candidatos encontrados."""
-    url = "http://api:8001/players/players/search"
-    resp = requests.get(url, params=dict(query=name, position=position, limit=limit), timeout=30)
-    resp.raise_for_status()
-    return resp.json()
+    """Candidatos por nombre (en proceso o vía /players/players/search)."""
+    async def query(db):
+        from apps.agent_service.player_search import search_players
+        return await search_players(db, name, limit)
+
+    return api_calls.call(
+        query, "/players/players/search", dict(query=name, position=position, limit=limit)
+    )
 
 player_lookup_tool = StructuredTool.from_function(
     name="player_lookup",
@@ -88,12 +102,30 @@ player_lookup_tool = StructuredTool.from_function(
 class NewsSearchInput(BaseModel):
     query: str = Field(..., description="Búsqueda en lenguaje natural")
     limit: int = Field(5, description="Máximo de noticias a devolver")
+    date_from: Optional[str] = Field(None, description="Sólo noticias desde esta fecha (YYYY-MM-DD)")
+    player_id: Optional[int] = Field(None, description="Sólo noticias enlazadas a este jugador")
 
-def _news_search(query: str, limit: int = 5) -> List[dict]:
-    url = "http://api:8001/news/search"
-    resp = requests.get(url, params=dict(query=query, limit=limit), timeout=30)
-    resp.raise_for_status()
-    return resp.json()
+def _news_search(
+    query: str, limit: int = 5, date_from: Optional[str] = None, player_id: Optional[int] = None
+) -> List[dict]:
+    params = dict(query=query, limit=limit, mode="hybrid")
+    if date_from:
+        params["date_from"] = date_from
+    if player_id is not None:
+        params["player_id"] = player_id
+
+    async def search(db):
+        from apps.agent_service.routers.news import search_news
+        return await search_news(
+            db,
+            query,
+            limit=limit,
+            mode="hybrid",
+            date_from=datetime.fromisoformat(date_from) if date_from else None,
+            player_id=player_id,
+        )
+
+    return api_calls.call(search, "/news/search", params)
 
 news_search_tool = StructuredTool.from_function(
     name="news_search",
@@ -108,11 +140,16 @@ class PlayerNewsInput(BaseModel):
     player_id: int = Field(..., description="ID del jugador")
     k: int = Field(5, description="Cuántas noticias devolver")
 
-def _player_news(player_id: int, k: int = 5) -> List[dict]:
-    url = f"http://api:8001/news/players/{player_id}/news"
-    resp = requests.get(url, params=dict(k=k), timeout=30)
-    resp.raise_for_status()
-    return resp.json()
+def _player_news(player_id: int, k: int = 5, include_content: bool = False) -> List[dict]:
+    async def query(db):
+        from apps.agent_service.routers.news import _parse_news_fields, fetch_player_news
+        return await fetch_player_news(
+            db, player_id, k=k, wanted=_parse_news_fields(None, include_content)
+        )
+
+    return api_calls.call(
+        query, f"/news/players/{player_id}/news", dict(k=k, include_content=include_content)
+    )
 
 player_news_tool = StructuredTool.from_function(
     name="player_news",
@@ -130,7 +167,7 @@ class SummarizePlayerNewsInput(BaseModel):
 def _summarize_player_news(player_id: int, k: int = 5) -> str:
     try:
         # Paso 1: Recuperar noticias
-        news = _player_news(player_id=player_id, k=k)
+        news = _player_news(player_id=player_id, k=k, include_content=True)
         if not news or len(news) == 0:
             return "No hay noticias relevantes sobre este jugador en los últimos meses."
 
@@ -0,0 +1,150 @@
+# apps/agent_service/bench_worker_rss.py
+"""
+Memoria por worker de la API: `uvicorn --workers N` frente a precarga + fork
+(`apps.agent_service.serve`).
+
+Arranca cada modo, espera a que `/ready` responda 200 y a que la memoria se
+estabilice, y lee `/proc/<pid>/smaps_rollup` de cada worker:
+
+  • RSS  → lo que enseñan `top` / `docker stats`; cuenta las páginas
+           compartidas en *cada* worker, así que no se puede sumar,
+  • PSS  → páginas compartidas repartidas entre quienes las comparten
+           (la suma de PSS es la RAM real del servicio),
+  • USS  → memoria privada: lo que se libera al matar ese worker.
+
+Con fork, el modelo aparece en el RSS de todos los workers pero sólo una vez
+en la suma de PSS; el USS por worker es lo que cuesta añadir uno más.
+
+    python -m apps.agent_service.bench_worker_rss --workers 4
+    python -m apps.agent_service.bench_worker_rss --workers 2 4 --modes fork
+
+Sólo Linux (necesita /proc). Usa la BD y Redis de DATABASE_URL / REDIS_URL.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+from typing import Dict, List
+
+MODES = {
+    "uvicorn": lambda port, n: [
+        sys.executable, "-m", "uvicorn", "apps.agent_service.main:app",
+        "--host", "127.0.0.1", "--port", str(port), "--workers", str(n),
+    ],
+    "fork": lambda port, n: [
+        sys.executable, "-m", "apps.agent_service.serve",
+        "--host", "127.0.0.1", "--port", str(port), "--workers", str(n),
+    ],
+}
+SMAPS_FIELDS = ("Rss", "Pss", "Private_Clean", "Private_Dirty")
+
+
+def smaps(pid: int) -> Dict[str, int]:
+    """Campos de `smaps_rollup` en kB."""
+    out = {}
+    for line in Path(f"/proc/{pid}/smaps_rollup").read_text().splitlines()[1:]:
+        key, value = line.split(":", 1)
+        if key in SMAPS_FIELDS:
+            out[key] = int(value.split()[0])
+    return out
+
+
+def children_of(pid: int) -> List[int]:
+    """PIDs de los workers hijos de `pid` (sin el resource_tracker de multiprocessing)."""
+    kids = []
+    for stat in Path("/proc").glob("[0-9]*/stat"):
+        try:
+            fields = stat.read_text().rsplit(")", 1)[1].split()
+            cmdline = (stat.parent / "cmdline").read_bytes()
+        except OSError:
+            continue
+        if int(fields[1]) == pid and b"resource_tracker" not in cmdline:
+            kids.append(int(stat.parent.name))
+    return sorted(kids)
+
+
+def _ready(port: int) -> bool:
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/ready", timeout=2) as r:
+            return r.status == 200
+    except OSError:
+        return False
+
+
+def _wait_stable(pids: List[int], settle: float, timeout: float) -> None:
+    """Espera hasta que el RSS total no cambia más de un 1 % en `settle` s."""
+    deadline = time.monotonic() + timeout
+    last = 0
+    while time.monotonic() < deadline:
+        total = sum(smaps(p)["Rss"] for p in pids)
+        if last and abs(total - last) <= 0.01 * last:
+            return
+        last = total
+        time.sleep(settle)
+
+
+def measure(mode: str, workers: int, port: int, settle: float, timeout: float) -> dict:
+    proc = subprocess.Popen(MODES[mode](port, workers), stdout=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            pids = children_of(proc.pid)
+            if len(pids) >= workers and _ready(port):
+                # /ready lo contesta un worker cualquiera: pedirlo varias veces
+                if all(_ready(port) for _ in range(4 * workers)):
+                    break
+            if proc.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError(f"{mode}: la API no llegó a estar lista")
+            time.sleep(1)
+
+        pids = children_of(proc.pid)
+        _wait_stable(pids, settle, timeout)
+        per_worker = [smaps(p) for p in pids]
+        parent = smaps(proc.pid)
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+    mb = lambda kb: round(kb / 1024, 1)     # noqa: E731
+    uss = [w["Private_Clean"] + w["Private_Dirty"] for w in per_worker]
+    return {
+        "mode": mode,
+        "workers": len(per_worker),
+        "rss_mb": mb(sum(w["Rss"] for w in per_worker) / len(per_worker)),
+        "pss_mb": mb(sum(w["Pss"] for w in per_worker) / len(per_worker)),
+        "uss_mb": mb(sum(uss) / len(uss)),
+        "total_pss_mb": mb(parent["Pss"] + sum(w["Pss"] for w in per_worker)),
+    }
+
+
+def main() -> None:
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        sys.exit("bench_worker_rss necesita Linux (/proc/<pid>/smaps_rollup)")
+
+    ap = argparse.ArgumentParser(description="RSS / PSS / USS por worker de la API")
+    ap.add_argument("--workers", type=int, nargs="+", default=[4])
+    ap.add_argument("--modes", nargs="+", choices=sorted(MODES), default=["uvicorn", "fork"])
+    ap.add_argument("--port", type=int, default=8011)
+    ap.add_argument("--settle", type=float, default=10.0, help="s entre lecturas de RSS")
+    ap.add_argument("--timeout", type=float, default=600.0)
+    args = ap.parse_args()
+
+    cols = ("mode", "workers", "rss_mb", "pss_mb", "uss_mb", "total_pss_mb")
+    print(" | ".join(f"{c:>12}" for c in cols))
+    for n in args.workers:
+        for mode in args.modes:
+            row = measure(mode, n, args.port, args.settle, args.timeout)
+            print(" | ".join(f"{row[c]:>12}" for c in cols), flush=True)
+
+
+if __name__ == "__main__":
+    main()
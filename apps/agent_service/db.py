@@ -4,26 +4,194 @@
 # ---------------------------------------------------------------------------
 
 import os
-from pathlib import Path
+import time
 from contextlib import contextmanager
 
-from sqlalchemy import create_engine
+import anyio
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from pgvector.asyncpg import register_vector
+
+from apps.agent_service.vector_storage import HNSW_EF_SEARCH, IVF_PROBES
+from apps.agent_service.metrics import (
+    DB_POOL_TIMEOUTS,
+    DB_POOL_WAIT,
+    instrument_engine,
+    observe_pool,
+)
 
 # URL →  usa la variable de entorno DATABASE_URL si existe
 DATABASE_URL = os.getenv(
     "DATABASE_URL",
     "postgresql+psycopg2://scout:scout@db:5432/scouting",
 )
+# misma BD con el driver asyncpg para los routers `async def`
+ASYNC_DATABASE_URL = os.getenv(
+    "ASYNC_DATABASE_URL",
+    DATABASE_URL.replace("+psycopg2", "+asyncpg"),
+)
+
+# parámetros de búsqueda vectorial fijados en cada conexión nueva del pool
+# (las búsquedas los suben con SET LOCAL si piden más candidatos)
+VECTOR_SEARCH_SETTINGS = (
+    f"SET ivfflat.probes = {IVF_PROBES}",
+    f"SET hnsw.ef_search = {HNSW_EF_SEARCH}",
+)
+
+# tamaño del pool (por engine y por proceso)
+POOL_OPTIONS = dict(
+    pool_size=int(os.getenv("DB_POOL_SIZE", "5")),
+    max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
+    pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+    pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800")),
+    pool_pre_ping=True,
+)
+
+
+# 0️⃣ pools instrumentados: miden la espera en el checkout y publican su estado
+class _TimedCheckoutMixin:
+    metric_label = "sync"
+
+    def _do_get(self):
+        t0 = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            DB_POOL_TIMEOUTS.labels(self.metric_label).inc()
+            raise
+        finally:
+            DB_POOL_WAIT.labels(self.metric_label).observe(time.perf_counter() - t0)
+            observe_pool(self.metric_label, self)
+
+    def _do_return_conn(self, record):
+        super()._do_return_conn(record)
+        observe_pool(self.metric_label, self)
+
+
+class TimedQueuePool(_TimedCheckoutMixin, QueuePool):
+    metric_label = "sync"
+
+
+class TimedAsyncQueuePool(_TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    metric_label = "async"
+
 
 # 1️⃣ motor y fábrica de sesiones
-engine = create_engine(DATABASE_URL, pool_pre_ping=True, future=True)
+engine = create_engine(DATABASE_URL, poolclass=TimedQueuePool, future=True, **POOL_OPTIONS)
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+instrument_engine(engine, "sync")
+
+
+def _apply_vector_search_settings(dbapi_connection) -> None:
+    """
+    SET de sesión en autocommit: dentro de la transacción implícita del driver
+    los revertiría el rollback del pool al devolver la conexión.
+    """
+    autocommit = dbapi_connection.autocommit
+    dbapi_connection.autocommit = True
+    try:
+        cursor = dbapi_connection.cursor()
+        for stmt in VECTOR_SEARCH_SETTINGS:
+            cursor.execute(stmt)
+        cursor.close()
+    finally:
+        dbapi_connection.autocommit = autocommit
 
 
-# 2️⃣ context manager para usar con `with`
-#@contextmanager
+@event.listens_for(engine, "connect")
+def _set_vector_search_params(dbapi_connection, _record):
+    """Fija `ivfflat.probes` / `hnsw.ef_search` en cada conexión nueva del pool."""
+    _apply_vector_search_settings(dbapi_connection)
+
+
+# 2️⃣ sesiones síncronas: dependencia FastAPI y context manager para `with`
 def get_session():
+    """Dependencia FastAPI (sync): una sesión por petición, cerrada siempre."""
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@contextmanager
+def session_scope():
+    """Uso fuera de FastAPI (tools, scripts): `with session_scope() as db:`."""
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+# 3️⃣ motor asíncrono (asyncpg) para FastAPI
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL, poolclass=TimedAsyncQueuePool, **POOL_OPTIONS
+)
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+instrument_engine(async_engine.sync_engine, "async")
+
+
+@event.listens_for(async_engine.sync_engine, "connect")
+def _setup_async_connection(dbapi_connection, _record):
+    """Registra el codec pgvector de asyncpg y fija los parámetros de búsqueda vectorial."""
+    dbapi_connection.run_async(register_vector)
+    _apply_vector_search_settings(dbapi_connection)
+
+
+async def get_async_session():
+    """Dependencia FastAPI: una AsyncSession por petición, siempre cerrada."""
+    async with AsyncSessionLocal() as session:
+        yield session
+
+
+# 4️⃣ arranque: pools abiertos antes de la primera petición
+# un literal vector carga la librería de pgvector en cada backend de Postgres
+_PRIME_SQL = "SELECT '[1]'::vector"
+# lo que debe ver una petición al sacar una conexión ya calentada
+_EXPECTED_SETTINGS = {"hnsw.ef_search": str(HNSW_EF_SEARCH), "ivfflat.probes": str(IVF_PROBES)}
+_SHOW_SQL = "SELECT current_setting('hnsw.ef_search'), current_setting('ivfflat.probes')"
+
+
+def _check_settings(pool: str, row) -> None:
+    found = dict(zip(_EXPECTED_SETTINGS, row))
+    if found != _EXPECTED_SETTINGS:
+        raise RuntimeError(f"{pool} pool: vector search settings lost on checkout: {found}")
+
+
+def _warm_sync_pool(size: int) -> None:
+    conns = [engine.connect() for _ in range(size)]
+    try:
+        for conn in conns:
+            conn.exec_driver_sql(_PRIME_SQL)
+    finally:
+        for conn in conns:
+            conn.close()                    # vuelven al pool, abiertas
+    with engine.connect() as conn:          # ya pasada por el reset del pool
+        _check_settings("sync", conn.exec_driver_sql(_SHOW_SQL).one())
 
-    return SessionLocal() 
 
+async def warm_pools(size: int = POOL_OPTIONS["pool_size"]) -> None:
+    """
+    Abre `size` conexiones en cada pool (sync y async) a la vez, de modo que el
+    evento `connect` ya ha fijado los parámetros vectoriales y registrado el
+    codec pgvector cuando llega el tráfico real. Después comprueba que una
+    conexión devuelta al pool conserva esos parámetros.
+    """
+    await anyio.to_thread.run_sync(_warm_sync_pool, size)
+    conns = []
+    try:
+        for _ in range(size):
+            conns.append(await async_engine.connect())
+        for conn in conns:
+            await conn.exec_driver_sql(_PRIME_SQL)
+    finally:
+        for conn in conns:
+            await conn.close()
+    async with async_engine.connect() as conn:
+        _check_settings("async", (await conn.exec_driver_sql(_SHOW_SQL)).one())
@@ -0,0 +1,236 @@
+# apps/agent_service/embeddings.py
+"""
+Servicio de embeddings compartido (uno por proceso).
+
+  • Carga el SentenceTransformer una sola vez (perezoso y thread-safe).
+  • `encode`        → codificación en lote (ingesta, backfills…).
+  • `encode_query`  → consultas de búsqueda, con caché LRU acotada de
+                      consulta normalizada → vector y estadísticas de aciertos.
+  • `QueryBatcher`  → micro-batching asíncrono: las consultas concurrentes de
+                      la API que llegan en una ventana corta (EMB_BATCH_WINDOW_MS)
+                      se codifican en un único forward del modelo.
+
+Lo usan tanto la API (`routers/news.py`) como la ingesta, de modo que nunca
+hay dos copias del modelo en el mismo proceso.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import List
+
+import anyio
+import numpy as np
+
+from apps.agent_service.metrics import EMBED_SECONDS
+
+EMB_MODEL = os.getenv("EMB_MODEL", "sentence-transformers/all-mpnet-base-v2")  # 768 d
+EMB_DIM = 768
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_EMB_CACHE_SIZE", "2048"))
+BATCH_WINDOW_MS = float(os.getenv("EMB_BATCH_WINDOW_MS", "5"))
+BATCH_MAX_SIZE = int(os.getenv("EMB_BATCH_MAX_SIZE", "32"))
+
+_WS_RE = re.compile(r"\s+")
+
+
+class EmbeddingService:
+    """Modelo de embeddings perezoso + caché LRU de consultas."""
+
+    def __init__(self, model_name: str = EMB_MODEL, cache_size: int = QUERY_CACHE_SIZE):
+        self.model_name = model_name
+        self.cache_size = cache_size
+        self._model = None
+        self._load_lock = threading.Lock()
+        self._cache: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    # ---------- modelo ----------
+    @property
+    def model(self):
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    from sentence_transformers import SentenceTransformer
+                    self._model = SentenceTransformer(self.model_name)
+        return self._model
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    def warmup(self) -> None:
+        """Carga el modelo y hace un forward de prueba (evita el coste en la 1ª petición)."""
+        self.encode(["warmup"])
+
+    def encode(
+        self,
+        texts: List[str],
+        batch_size: int = 32,
+        show_progress_bar: bool = False,
+    ) -> np.ndarray:
+        with EMBED_SECONDS.labels("forward").time():
+            return self.model.encode(
+                texts,
+                batch_size=batch_size,
+                show_progress_bar=show_progress_bar,
+                convert_to_numpy=True,
+            )
+
+    # ---------- consultas (con caché) ----------
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """NFKC + minúsculas + espacios colapsados (clave de caché y texto a codificar)."""
+        query = unicodedata.normalize("NFKC", query or "").lower()
+        return _WS_RE.sub(" ", query).strip()
+
+    def _cache_get(self, key: str) -> np.ndarray | None:
+        with self._cache_lock:
+            vec = self._cache.get(key)
+            if vec is None:
+                self.misses += 1
+                return None
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return vec
+
+    def _cache_put(self, key: str, vec: np.ndarray) -> None:
+        vec.setflags(write=False)          # los vectores cacheados son compartidos
+        with self._cache_lock:
+            self._cache[key] = vec
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def encode_query(self, query: str) -> np.ndarray:
+        key = self.normalize_query(query)
+        vec = self._cache_get(key)
+        if vec is None:
+            vec = self.encode([key])[0]
+            self._cache_put(key, vec)
+        return vec
+
+    def stats(self) -> dict:
+        with self._cache_lock:
+            total = self.hits + self.misses
+            return {
+                "model": self.model_name,
+                "loaded": self.loaded,
+                "size": len(self._cache),
+                "capacity": self.cache_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+class QueryBatcher:
+    """
+    Agrupa las consultas concurrentes del event loop en lotes: espera hasta
+    `window_ms` o `max_batch` consultas, las codifica en un único forward
+    (en un hilo, sin bloquear el loop) y resuelve el future de cada petición.
+    Los aciertos de la caché LRU no pasan por la cola.
+    """
+
+    def __init__(
+        self,
+        service: EmbeddingService,
+        window_ms: float = BATCH_WINDOW_MS,
+        max_batch: int = BATCH_MAX_SIZE,
+    ):
+        self.service = service
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+        self._batch: list = []                    # lote en curso (fuera de la cola)
+        self.batches = 0
+        self.batched_queries = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self) -> None:
+        if not self.running:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run(), name="query-batcher")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            # peticiones en vuelo: que fallen ya en vez de quedarse colgadas
+            pending = self._batch
+            self._batch = []
+            while not self._queue.empty():
+                pending.append(self._queue.get_nowait())
+            for _, fut in pending:
+                if not fut.done():
+                    fut.set_exception(RuntimeError("batcher stopped"))
+
+    async def encode(self, query: str) -> np.ndarray:
+        key = self.service.normalize_query(query)
+        vec = self.service._cache_get(key)
+        if vec is not None:
+            return vec
+        if not self.running:                      # p.ej. scripts / sin lifespan
+            vec = (await anyio.to_thread.run_sync(self.service.encode, [key]))[0]
+            self.service._cache_put(key, vec)
+            return vec
+
+        fut = asyncio.get_running_loop().create_future()
+        await self._queue.put((key, fut))
+        return await fut
+
+    async def _next_batch(self) -> list:
+        loop = asyncio.get_running_loop()
+        self._batch = batch = [await self._queue.get()]
+        deadline = loop.time() + self.window
+        while len(batch) < self.max_batch:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._next_batch()
+            keys = list(dict.fromkeys(key for key, _ in batch))   # sin duplicados
+            try:
+                vecs = await anyio.to_thread.run_sync(self.service.encode, keys)
+            except Exception as exc:                               # noqa: BLE001
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(exc)
+                self._batch = []
+                continue
+
+            by_key = dict(zip(keys, vecs))
+            for key, vec in by_key.items():
+                self.service._cache_put(key, vec)
+            for key, fut in batch:
+                if not fut.done():                 # el cliente pudo cancelar
+                    fut.set_result(by_key[key])
+
+            self._batch = []
+            self.batches += 1
+            self.batched_queries += len(batch)
+
+
+# instancias únicas del proceso
+embedding_service = EmbeddingService()
+query_batcher = QueryBatcher(embedding_service)
@@ -0,0 +1,312 @@
+# apps/agent_service/faiss_index.py
+"""
+Backend FAISS (opcional) para jugadores similares y búsqueda semántica de noticias.
+
+  • VECTOR_BACKEND=faiss  activa este backend (por defecto: índice NumPy /
+    pgvector). Si `faiss` no está instalado se vuelve al backend por defecto.
+  • Tipos de índice: "flat" (exacto), "hnsw" o "ivfpq"
+    (FAISS_PLAYERS_INDEX / FAISS_NEWS_INDEX). Todos con producto interno sobre
+    vectores L2-normalizados (= similitud coseno) envueltos en IndexIDMap2,
+    de modo que FAISS devuelve directamente los ids de la BD.
+  • Persistencia: cada índice se guarda en FAISS_INDEX_DIR con el sello de
+    `data_versions` con el que se construyó → arranque rápido sin reconstruir.
+    Un `flock` sobre `<índice>.lock` serializa lectura y escritura entre
+    workers: sólo uno construye cada versión y el resto la carga del disco.
+  • Reconstrucción en segundo plano cuando cambia el sello (tras la ingesta):
+    mientras tanto se sigue sirviendo el índice anterior y, al terminar, los
+    lectores pasan al nuevo con un único cambio de referencia (atómico).
+  • Filtros por id: `allowed_ids` se traduce en un IDSelectorBatch, así los
+    filtros club/posición/edad se aplican dentro de la búsqueda.
+"""
+from __future__ import annotations
+
+import fcntl
+import json
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Optional, Tuple
+
+import anyio
+import numpy as np
+from sqlalchemy import select
+
+from apps.agent_service.db import SessionLocal
+from apps.agent_service.player_index import player_index
+from apps.agent_service.versions import data_versions
+from apps.ingestion.seed_and_ingest import FootballNews
+
+try:
+    import faiss
+except ImportError:                     # dependencia opcional
+    faiss = None
+
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "numpy")
+FAISS_ENABLED = VECTOR_BACKEND == "faiss" and faiss is not None
+FAISS_INDEX_DIR = Path(os.getenv("FAISS_INDEX_DIR", "/app/media_data/faiss"))
+FAISS_PLAYERS_INDEX = os.getenv("FAISS_PLAYERS_INDEX", "flat")
+FAISS_NEWS_INDEX = os.getenv("FAISS_NEWS_INDEX", "hnsw")
+FAISS_HNSW_M = int(os.getenv("FAISS_HNSW_M", "32"))
+FAISS_EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", "64"))
+FAISS_NPROBE = int(os.getenv("FAISS_NPROBE", "16"))
+IVFPQ_MIN_ROWS = 10_000                 # por debajo, PQ no tiene datos para entrenar
+POSTFILTER_MAX_EXCLUDED = 64            # hasta aquí se filtra tras buscar, sin selector
+
+Loader = Callable[[], Tuple[np.ndarray, np.ndarray]]   # → (matrix float32 normalizada, ids int64)
+
+
+def normalize(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _pq_subquantizers(d: int) -> int:
+    """Divisor de d con 2–16 dimensiones por subcuantizador (o d si no existe)."""
+    for m in range(min(d // 2, 96), 0, -1):
+        if d % m == 0 and 2 <= d // m <= 16:
+            return m
+    return d
+
+
+@dataclass(frozen=True)
+class _Loaded:
+    index: "faiss.Index"
+    kind: str
+    version: int
+
+
+class FaissIndex:
+    def __init__(self, name: str, kind: str):
+        self.name = name
+        self.kind = kind
+        self._current: Optional[_Loaded] = None
+        self._build_lock = threading.Lock()
+        self._building_version: Optional[int] = None
+
+    # ---------- disco ----------
+    @property
+    def _path(self) -> Path:
+        return FAISS_INDEX_DIR / f"{self.name}-{self.kind}.faiss"
+
+    @property
+    def _meta_path(self) -> Path:
+        return self._path.with_suffix(".json")
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool):
+        """Lock entre procesos: índice y .json se leen/escriben siempre como pareja."""
+        FAISS_INDEX_DIR.mkdir(parents=True, exist_ok=True)
+        with open(self._path.with_suffix(".lock"), "a") as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def _disk_version(self) -> Optional[int]:
+        try:
+            return int(json.loads(self._meta_path.read_text())["version"])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _read(self) -> Optional[_Loaded]:
+        try:
+            meta = json.loads(self._meta_path.read_text())
+            index = faiss.read_index(str(self._path))
+        except (OSError, ValueError, RuntimeError):
+            return None
+        return _Loaded(index, meta.get("kind", self.kind), int(meta["version"]))
+
+    def _load_from_disk(self) -> Optional[_Loaded]:
+        with self._file_lock(exclusive=False):
+            return self._read()
+
+    def _replace(self, target: Path, write: Callable[[str], None]) -> None:
+        # nombre temporal propio de cada proceso/llamada: nunca se mezclan escrituras
+        tmp = f"{target}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+        try:
+            write(tmp)
+            os.replace(tmp, target)
+        finally:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+
+    def _save(self, loaded: _Loaded) -> None:
+        """Escribe índice y .json; llamar con `_file_lock(exclusive=True)`."""
+        meta = json.dumps({"version": loaded.version, "kind": loaded.kind})
+        self._replace(self._path, lambda tmp: faiss.write_index(loaded.index, tmp))
+        self._replace(self._meta_path, lambda tmp: Path(tmp).write_text(meta))
+
+    # ---------- construcción ----------
+    def _build(self, matrix: np.ndarray, ids: np.ndarray) -> Tuple["faiss.Index", str]:
+        n, d = matrix.shape
+        kind = self.kind
+        if kind == "ivfpq" and n < IVFPQ_MIN_ROWS:
+            kind = "flat"
+
+        if kind == "hnsw":
+            base = faiss.IndexHNSWFlat(d, FAISS_HNSW_M, faiss.METRIC_INNER_PRODUCT)
+            base.hnsw.efConstruction = 2 * FAISS_HNSW_M
+        elif kind == "ivfpq":
+            nlist = max(1, min(int(4 * n ** 0.5), n // 39))
+            quantizer = faiss.IndexFlatIP(d)
+            base = faiss.IndexIVFPQ(
+                quantizer, d, nlist, _pq_subquantizers(d), 8, faiss.METRIC_INNER_PRODUCT
+            )
+            base.train(matrix)
+        else:
+            kind = "flat"
+            base = faiss.IndexFlatIP(d)
+
+        index = faiss.IndexIDMap2(base)
+        if n:
+            index.add_with_ids(matrix, ids.astype(np.int64))
+        return index, kind
+
+    def rebuild(self, version: int, loader: Loader) -> _Loaded:
+        with self._build_lock:
+            cur = self._current
+            if cur is not None and cur.version == version:
+                return cur
+            with self._file_lock(exclusive=True):
+                on_disk = self._disk_version()
+                loaded = self._read() if on_disk == version else None
+                if loaded is None:                     # otro worker no la ha construido ya
+                    matrix, ids = loader()
+                    index, kind = self._build(matrix, ids)
+                    loaded = _Loaded(index, kind, version)
+                    if on_disk is None or on_disk < version:   # nunca pisar una más nueva
+                        self._save(loaded)
+                    print(f"🧭  FAISS {self.name} index v{version} ({kind}, {index.ntotal} vectors)")
+            self._current = loaded                     # swap atómico
+            return loaded
+
+    def _rebuild_in_background(self, version: int, loader: Loader) -> None:
+        if self._building_version == version:
+            return
+        self._building_version = version
+
+        def _run():
+            try:
+                self.rebuild(version, loader)
+            finally:
+                self._building_version = None
+
+        threading.Thread(target=_run, name=f"faiss-{self.name}", daemon=True).start()
+
+    async def aensure(self, version: int, loader: Loader) -> _Loaded:
+        """Índice listo para buscar; si hay uno anterior, lo sirve mientras se reconstruye."""
+        cur = self._current
+        if cur is None:
+            cur = await anyio.to_thread.run_sync(self._load_from_disk)
+            if cur is None:
+                return await anyio.to_thread.run_sync(self.rebuild, version, loader)
+            self._current = cur
+        if cur.version != version:
+            self._rebuild_in_background(version, loader)
+        return cur
+
+    # ---------- búsqueda ----------
+    def _params(self, kind: str, selector) -> "faiss.SearchParameters":
+        if kind == "hnsw":
+            return faiss.SearchParametersHNSW(sel=selector, efSearch=FAISS_EF_SEARCH)
+        if kind == "ivfpq":
+            return faiss.SearchParametersIVF(sel=selector, nprobe=FAISS_NPROBE)
+        return faiss.SearchParameters(sel=selector)
+
+    def search(
+        self,
+        loaded: _Loaded,
+        query: np.ndarray,
+        k: int,
+        allowed_ids: Optional[np.ndarray] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """(ids, similitudes) ordenados; `allowed_ids` restringe los candidatos."""
+        empty = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        if loaded.index.ntotal == 0:
+            return empty
+        query = normalize(np.asarray(query, dtype=np.float32).reshape(1, -1))
+        params = None
+        if allowed_ids is not None:
+            if len(allowed_ids) == 0:
+                return empty
+            selector = faiss.IDSelectorBatch(np.ascontiguousarray(allowed_ids, dtype=np.int64))
+            params = self._params(loaded.kind, selector)
+        elif loaded.kind != "flat":
+            params = self._params(loaded.kind, None)
+
+        sims, ids = loaded.index.search(query, k, params=params)
+        keep = ids[0] >= 0                           # -1 = hueco (menos de k candidatos)
+        return ids[0][keep], sims[0][keep]
+
+
+# instancias únicas del proceso
+faiss_players = FaissIndex("players", FAISS_PLAYERS_INDEX)
+faiss_news = FaissIndex("news", FAISS_NEWS_INDEX)
+
+
+# ---------- integración con los routers ----------
+def _load_news_vectors() -> Tuple[np.ndarray, np.ndarray]:
+    stmt = select(FootballNews.id, FootballNews.embedding).where(
+        FootballNews.embedding.is_not(None)
+    )
+    ids, vectors = [], []
+    with SessionLocal() as db:
+        for r in db.execute(stmt.execution_options(stream_results=True, yield_per=2048)):
+            ids.append(r.id)
+            vectors.append(np.asarray(r.embedding, dtype=np.float32))
+    if not vectors:
+        return np.empty((0, 1), dtype=np.float32), np.empty(0, dtype=np.int64)
+    return normalize(np.vstack(vectors)), np.array(ids, dtype=np.int64)
+
+
+async def similar_players(player_id: int, *, k: int = 15, **filters) -> Optional[list]:
+    """
+    Igual que `PlayerIndex.similar` pero la búsqueda la hace FAISS: los filtros
+    se calculan sobre el snapshot y llegan al índice como lista de ids permitidos.
+    """
+    snap = await player_index.aensure_fresh()
+    row = snap.row_of.get(player_id)
+    if row is None:
+        return None
+
+    mask = player_index.filter_mask(snap, **filters)
+    mask[row] = False
+    if snap.club[row] is not None:
+        mask &= snap.club != snap.club[row]
+
+    loaded = await faiss_players.aensure(snap.version, lambda: (snap.matrix, snap.ids))
+    # Si la máscara sólo quita unos pocos (él mismo, su club): búsqueda sin
+    # selector pidiendo esos de más y descartándolos después, en vez de un
+    # IDSelectorBatch O(n) y la búsqueda filtrada en cada consulta.
+    excluded = len(mask) - int(mask.sum())
+    if excluded <= POSTFILTER_MAX_EXCLUDED:
+        ids, sims = faiss_players.search(loaded, snap.matrix[row], k + excluded)
+    else:
+        ids, sims = faiss_players.search(loaded, snap.matrix[row], k, snap.ids[mask])
+
+    out = []
+    for pid, sim in zip(ids.tolist(), sims.tolist()):
+        i = snap.row_of.get(pid)
+        if i is None or not mask[i]:    # índice anterior aún en servicio / filtrado
+            continue
+        out.append({
+            "id": pid,
+            "full_name": snap.full_name[i],
+            "club": snap.club[i],
+            "dist": float(sim),
+        })
+    return out[:k]
+
+
+async def search_news(query_vec: np.ndarray, limit: int) -> Tuple[list, list]:
+    """(ids, similitudes) de las noticias más cercanas a `query_vec`."""
+    version = (await data_versions.aget("news")).version
+    loaded = await faiss_news.aensure(version, _load_news_vectors)
+    ids, sims = faiss_news.search(loaded, query_vec, limit)
+    return ids.tolist(), sims.tolist()
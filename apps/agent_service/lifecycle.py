@@ -0,0 +1,114 @@
+# apps/agent_service/lifecycle.py
+"""
+Calentamiento de la API al arrancar y estado de preparación (`/ready`).
+
+El proceso acepta conexiones en cuanto arranca (liveness), pero `/ready`
+responde 503 hasta que han terminado, en segundo plano:
+
+  • embedder  → carga del SentenceTransformer + forward de prueba,
+  • database  → pools sync/async abiertos, con los parámetros de búsqueda
+                vectorial fijados y pgvector cargado en cada backend,
+  • indexes   → sellos de `data_versions`, snapshot de jugadores en memoria
+                e índices FAISS (si VECTOR_BACKEND=faiss).
+
+Así el balanceador no envía tráfico a un worker frío: la primera
+`/news/search` ya no paga la carga del modelo ni el establecimiento de
+conexiones. Si Postgres o el modelo fallan se reintenta con espera creciente;
+los índices son una optimización (los routers tienen alternativa), de modo que
+un fallo ahí se registra y no bloquea la preparación.
+"""
+from __future__ import annotations
+
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+import anyio
+
+from apps.agent_service.db import warm_pools
+from apps.agent_service.embeddings import embedding_service
+from apps.agent_service.faiss_index import (
+    FAISS_ENABLED,
+    _load_news_vectors,
+    faiss_news,
+    faiss_players,
+)
+from apps.agent_service.player_index import PLAYER_INDEX_ENABLED, player_index
+from apps.agent_service.versions import data_versions
+
+RETRY_MAX_DELAY = 30.0          # s entre reintentos como máximo
+
+
+class Readiness:
+    """Qué pasos del arranque han terminado (y cuánto han tardado)."""
+
+    def __init__(self, steps=("embedder", "database", "indexes")):
+        self._started = time.monotonic()
+        self.steps: Dict[str, Optional[float]] = {name: None for name in steps}
+        self.errors: Dict[str, str] = {}
+
+    def done(self, name: str) -> None:
+        self.steps[name] = round(time.monotonic() - self._started, 3)
+        self.errors.pop(name, None)
+
+    @property
+    def ready(self) -> bool:
+        return all(t is not None for t in self.steps.values())
+
+    def status(self) -> dict:
+        return {
+            "ready": self.ready,
+            "steps": {name: t is not None for name, t in self.steps.items()},
+            "seconds": {name: t for name, t in self.steps.items() if t is not None},
+            "errors": dict(self.errors),
+        }
+
+
+async def _retrying(readiness: Readiness, name: str, step: Callable[[], Awaitable]) -> None:
+    delay = 1.0
+    while True:
+        try:
+            await step()
+        except Exception as exc:        # BD aún arrancando, modelo sin descargar…
+            readiness.errors[name] = repr(exc)
+            print(f"⚠️  warmup {name}: {exc!r} (reintento en {delay:.0f}s)")
+            await anyio.sleep(delay)
+            delay = min(delay * 2, RETRY_MAX_DELAY)
+        else:
+            readiness.done(name)
+            return
+
+
+async def _warm_embedder() -> None:
+    await anyio.to_thread.run_sync(embedding_service.warmup)
+
+
+async def _warm_indexes(readiness: Readiness) -> None:
+    try:
+        players = await data_versions.aget("players")
+        news = await data_versions.aget("news")
+        if PLAYER_INDEX_ENABLED:
+            snap = await player_index.aensure_fresh()
+            if FAISS_ENABLED:
+                await faiss_players.aensure(snap.version, lambda: (snap.matrix, snap.ids))
+        if FAISS_ENABLED:
+            await faiss_news.aensure(news.version, _load_news_vectors)
+        print(f"🔥  índices listos (players v{players.version}, news v{news.version})")
+    except Exception as exc:            # BD vacía, tablas sin crear…
+        print(f"⚠️  warmup indexes: {exc!r} (se cargarán en la primera petición)")
+        readiness.done("indexes")
+        readiness.errors["indexes"] = repr(exc)
+        return
+    readiness.done("indexes")
+
+
+async def warm_up(readiness: Readiness) -> None:
+    """Embedder y BD en paralelo; los índices, en cuanto la BD responde."""
+
+    async def _database_then_indexes():
+        await _retrying(readiness, "database", warm_pools)
+        await _warm_indexes(readiness)
+
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(_retrying, readiness, "embedder", _warm_embedder)
+        tg.start_soon(_database_then_indexes)
+    print(f"✅  API lista ({readiness.status()['seconds']})")
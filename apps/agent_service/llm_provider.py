@@ -12,8 +12,10 @@ Admite:
 from __future__ import annotations
 
 import os
+from functools import lru_cache
 from typing import List, Optional
 
+import httpx
 from langchain.callbacks.base import BaseCallbackHandler
 from langchain_openai import ChatOpenAI
 
@@ -22,31 +24,63 @@ import langchain
 langchain.debug = True       
 langchain.verbose = True
 
+LLM_TIMEOUT = 60
+# conexiones keep-alive al proveedor compartidas por todo el proceso
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
 
-def get_llm(
-    *,
-    stream: bool = False,
-    callbacks: Optional[List[BaseCallbackHandler]] = None,
-):
-    """
-    Parameters
-    ----------
-    stream : bool
-        Si True el modelo devolverá los tokens en streaming.
-    callbacks : list[BaseCallbackHandler] | None
-        Callbacks que procesarán los tokens (streaming, tracing, logging…).
-    """
+
+@lru_cache(maxsize=1)
+def _http_clients() -> tuple[httpx.Client, httpx.AsyncClient]:
+    """Pool HTTP único (sync + async): sin handshake TLS nuevo por turno de chat."""
+    limits = httpx.Limits(
+        max_connections=LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_MAX_CONNECTIONS,
+    )
+    return (
+        httpx.Client(limits=limits, timeout=LLM_TIMEOUT),
+        httpx.AsyncClient(limits=limits, timeout=LLM_TIMEOUT),
+    )
+
+
+def _build_llm(stream: bool, callbacks: Optional[List[BaseCallbackHandler]]) -> ChatOpenAI:
     # --- OpenAI remoto ---------------------------------------------------- #
     api_key = os.environ["OPENAI_API_KEY"]          # ❶ fail-fast si no existe
+    http_client, http_async_client = _http_clients()
 
     return ChatOpenAI(
         api_key=api_key,
         base_url=os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1"),
         model_name=os.getenv("OPENAI_MODEL", "gpt-4o"),
         temperature=0.2,
-        request_timeout=60,
+        request_timeout=LLM_TIMEOUT,
         streaming=stream,
         callbacks=callbacks,
+        http_client=http_client,
+        http_async_client=http_async_client,
     )
 
 
+@lru_cache(maxsize=2)
+def _shared_llm(stream: bool) -> ChatOpenAI:
+    return _build_llm(stream, None)
+
+
+def get_llm(
+    *,
+    stream: bool = False,
+    callbacks: Optional[List[BaseCallbackHandler]] = None,
+):
+    """
+    Parameters
+    ----------
+    stream : bool
+        Si True el modelo devolverá los tokens en streaming.
+    callbacks : list[BaseCallbackHandler] | None
+        Callbacks que procesarán los tokens (streaming, tracing, logging…).
+
+    Sin callbacks devuelve la instancia compartida del proceso (es thread-safe);
+    con callbacks, una instancia propia sobre el mismo pool HTTP.
+    """
+    if callbacks:
+        return _build_llm(stream, callbacks)
+    return _shared_llm(stream)
@@ -1,11 +1,56 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Response
+from fastapi.responses import ORJSONResponse
+from apps.agent_service.agents import api_calls
+from apps.agent_service.embeddings import query_batcher
+from apps.agent_service.lifecycle import Readiness, warm_up
+from apps.agent_service.metrics import MetricsMiddleware, render_latest
+from apps.agent_service.response_cache import response_cache
 from apps.agent_service.routers import players, news, chat
 import langchain
 
 langchain.debug = True       
 langchain.verbose = True
 
-app = FastAPI(title="Smart-Scout API")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # calentamiento en segundo plano: /ready da 503 hasta que termina
+    app.state.readiness = Readiness()
+    await query_batcher.start()
+    warmup = asyncio.create_task(warm_up(app.state.readiness))
+    # las tools del agente ejecutan sus consultas en este loop (sin HTTP contra sí misma)
+    api_calls.bind_loop(asyncio.get_running_loop())
+    yield
+    api_calls.bind_loop(None)
+    warmup.cancel()
+    await query_batcher.stop()
+    await response_cache.close()
+
+
+# orjson para todas las respuestas (numpy nativo, sin el encoder recursivo de FastAPI)
+app = FastAPI(title="Smart-Scout API", lifespan=lifespan, default_response_class=ORJSONResponse)
+app.add_middleware(MetricsMiddleware)     # latencia / estados / en curso / tiempo de BD por ruta
 app.include_router(players.router)
 app.include_router(news.router)
-app.include_router(chat.router)
\ No newline at end of file
+app.include_router(chat.router)
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    payload, content_type = render_latest()
+    return Response(payload, media_type=content_type)
+
+
+@app.get("/ready", include_in_schema=False)
+def ready():
+    """200 cuando modelo, pools e índices están calientes; 503 mientras tanto."""
+    status = app.state.readiness.status()
+    return ORJSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
+@app.get("/cache/stats", summary="Aciertos / fallos de la caché de respuestas")
+def cache_stats():
+    return response_cache.stats()
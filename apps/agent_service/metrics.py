@@ -0,0 +1,205 @@
+# apps/agent_service/metrics.py
+"""
+Métricas Prometheus del servicio (expuestas en `/metrics`).
+
+  • Pool de conexiones: espera al hacer checkout, timeouts y conexiones en
+    uso / ociosas / overflow de cada pool registrado (sync y async).
+  • HTTP (MetricsMiddleware): latencia por ruta, respuestas por código y
+    peticiones en curso. La etiqueta `route` es la plantilla
+    (`/players/{player_id}/similar`), no la URL → cardinalidad acotada.
+  • BD: duración de cada sentencia y tiempo/nº de consultas por petición
+    (eventos `before/after_cursor_execute` de SQLAlchemy).
+  • Embeddings: forward del modelo y espera de la consulta en el router.
+
+Con varios workers (`apps.agent_service.serve`) el padre fija
+PROMETHEUS_MULTIPROC_DIR antes de importar nada: cada worker escribe sus
+valores en ficheros de ese directorio y `/metrics` agrega los de todos,
+conteste el worker que conteste. Los gauges usan `livesum` (suma de los
+workers vivos).
+"""
+from __future__ import annotations
+
+import os
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event
+from starlette.routing import Match
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# ─── Pool de conexiones ─────────────────────────────────────────────
+DB_POOL_WAIT = Histogram(
+    "scout_db_pool_checkout_wait_seconds",
+    "Tiempo esperando una conexión libre del pool",
+    ["pool"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30),
+)
+DB_POOL_TIMEOUTS = Counter(
+    "scout_db_pool_timeouts_total",
+    "Checkouts que agotaron pool_timeout",
+    ["pool"],
+)
+DB_POOL_SIZE = Gauge(
+    "scout_db_pool_size", "Tamaño configurado del pool",
+    ["pool"], multiprocess_mode="livesum",
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "scout_db_pool_checked_out", "Conexiones en uso",
+    ["pool"], multiprocess_mode="livesum",
+)
+DB_POOL_CHECKED_IN = Gauge(
+    "scout_db_pool_checked_in", "Conexiones ociosas en el pool",
+    ["pool"], multiprocess_mode="livesum",
+)
+DB_POOL_OVERFLOW = Gauge(
+    "scout_db_pool_overflow", "Conexiones abiertas por encima de pool_size",
+    ["pool"], multiprocess_mode="livesum",
+)
+
+# ─── HTTP ───────────────────────────────────────────────────────────
+HTTP_LATENCY = Histogram(
+    "scout_http_request_duration_seconds",
+    "Latencia de las peticiones HTTP (hasta el último byte)",
+    ["method", "route"],
+    buckets=LATENCY_BUCKETS,
+)
+HTTP_REQUESTS = Counter(
+    "scout_http_requests_total",
+    "Peticiones HTTP por código de respuesta",
+    ["method", "route", "status"],
+)
+HTTP_IN_FLIGHT = Gauge(
+    "scout_http_requests_in_flight",
+    "Peticiones HTTP en curso",
+    ["route"],
+    multiprocess_mode="livesum",
+)
+
+# ─── Base de datos ──────────────────────────────────────────────────
+DB_QUERY_DURATION = Histogram(
+    "scout_db_query_duration_seconds",
+    "Duración de cada sentencia SQL",
+    ["engine"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5),
+)
+REQUEST_DB_TIME = Histogram(
+    "scout_http_request_db_seconds",
+    "Tiempo total en la BD por petición HTTP",
+    ["route"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUEST_DB_QUERIES = Histogram(
+    "scout_http_request_db_queries",
+    "Nº de sentencias SQL por petición HTTP",
+    ["route"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100),
+)
+
+# ─── Embeddings ─────────────────────────────────────────────────────
+EMBED_SECONDS = Histogram(
+    "scout_embedding_seconds",
+    "Tiempo de embeddings: forward del modelo / consulta en el router (incluye cola y caché)",
+    ["stage"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 10),
+)
+
+def observe_pool(name: str, pool) -> None:
+    """Estado del pool `name`; lo llama el propio pool en cada checkout / devolución."""
+    DB_POOL_SIZE.labels(name).set(pool.size())
+    DB_POOL_CHECKED_OUT.labels(name).set(pool.checkedout())
+    DB_POOL_CHECKED_IN.labels(name).set(pool.checkedin())
+    DB_POOL_OVERFLOW.labels(name).set(max(pool.overflow(), 0))
+
+
+# ─── Tiempo de BD por petición ──────────────────────────────────────
+class _DbTimer:
+    __slots__ = ("seconds", "queries")
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.queries = 0
+
+
+# objeto mutable por petición: lo ven el endpoint, sus tareas y el threadpool
+_request_db: ContextVar[Optional[_DbTimer]] = ContextVar("scout_request_db", default=None)
+
+
+def instrument_engine(engine, name: str) -> None:
+    """Mide cada sentencia de `engine` (sync, o `async_engine.sync_engine`)."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        context._scout_t0 = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._scout_t0
+        DB_QUERY_DURATION.labels(name).observe(elapsed)
+        timer = _request_db.get()
+        if timer is not None:
+            timer.seconds += elapsed
+            timer.queries += 1
+
+
+# ─── Middleware HTTP (ASGI puro: válido también para StreamingResponse) ─
+def _route_template(scope) -> str:
+    app = scope.get("app")
+    for route in getattr(getattr(app, "router", None), "routes", ()):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", "unmatched")
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        route = _route_template(scope)
+        method = scope["method"]
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        timer = _DbTimer()
+        token = _request_db.set(timer)
+        in_flight = HTTP_IN_FLIGHT.labels(route)
+        in_flight.inc()
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_LATENCY.labels(method, route).observe(time.perf_counter() - t0)
+            HTTP_REQUESTS.labels(method, route, str(status["code"])).inc()
+            REQUEST_DB_TIME.labels(route).observe(timer.seconds)
+            REQUEST_DB_QUERIES.labels(route).observe(timer.queries)
+            in_flight.dec()
+            _request_db.reset(token)
+
+
+def render_latest() -> tuple[bytes, str]:
+    """Payload + content-type para el endpoint `/metrics`."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)    # todos los workers
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,260 @@
+# apps/agent_service/player_index.py
+"""
+Índice en memoria para `/players/{id}/similar`.
+
+La tabla `players` son unos pocos miles de vectores de 43 dimensiones: cabe
+entera en una matriz float32 contigua (filas normalizadas → coseno = producto
+escalar) junto a arrays por columna para los filtros (posición, club, edad,
+minutos, nacionalidad). Cada búsqueda es:
+
+  1. máscara booleana con los filtros,
+  2. producto matriz·vector sobre las filas que pasan,
+  3. `argpartition` para el top-k (+ orden final de sólo k elementos).
+
+Resultado exacto (sin el recall parcial de ivfflat tras filtrar) y sin ida y
+vuelta a la BD. El índice se recarga cuando cambia el sello "players" de
+`data_versions` (la ingesta lo incrementa al recalcular los vectores).
+"""
+from __future__ import annotations
+
+import os
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+import anyio
+import numpy as np
+from sqlalchemy import select
+
+from apps.agent_service.db import SessionLocal
+from apps.agent_service.versions import data_versions
+from apps.ingestion.seed_and_ingest import Player
+
+PLAYER_INDEX_ENABLED = os.getenv("PLAYER_INDEX_ENABLED", "1") == "1"
+
+
+@dataclass(frozen=True)
+class _Snapshot:
+    version: int
+    ids: np.ndarray              # int64   (n,)
+    row_of: Dict[int, int]       # player_id → fila
+    matrix: np.ndarray           # float32 (n, d) filas L2-normalizadas
+    full_name: np.ndarray        # object  (n,)
+    position: np.ndarray         # object  (n,)
+    club: np.ndarray             # object  (n,)
+    nationality: np.ndarray      # object  (n,)
+    age: np.ndarray              # float64 (n,) NaN = desconocido
+    minutes: np.ndarray          # float64 (n,) NaN = desconocido
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+def _as_float(values: Sequence) -> np.ndarray:
+    return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+
+class PlayerIndex:
+    """Snapshot inmutable + recarga atómica (los lectores nunca ven un índice a medias)."""
+
+    def __init__(self):
+        self._snapshot: Optional[_Snapshot] = None
+        self._reload_lock = threading.Lock()
+
+    @property
+    def snapshot(self) -> Optional[_Snapshot]:
+        return self._snapshot
+
+    # ---------- carga ----------
+    @staticmethod
+    def _load(version: int) -> _Snapshot:
+        stmt = select(
+            Player.id,
+            Player.full_name,
+            Player.position,
+            Player.club,
+            Player.nationality,
+            Player.age,
+            Player.minutes,
+            Player.feature_vector,
+        ).where(Player.feature_vector.is_not(None)).order_by(Player.id)
+
+        with SessionLocal() as db:
+            rows = db.execute(stmt).all()
+
+        if rows:
+            matrix = np.ascontiguousarray(
+                np.vstack([np.asarray(r.feature_vector, dtype=np.float32) for r in rows])
+            )
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            matrix /= norms
+        else:
+            matrix = np.empty((0, 0), dtype=np.float32)
+
+        ids = np.array([r.id for r in rows], dtype=np.int64)
+        return _Snapshot(
+            version=version,
+            ids=ids,
+            row_of={int(pid): i for i, pid in enumerate(ids)},
+            matrix=matrix,
+            full_name=np.array([r.full_name for r in rows], dtype=object),
+            position=np.array([r.position for r in rows], dtype=object),
+            club=np.array([r.club for r in rows], dtype=object),
+            nationality=np.array([r.nationality for r in rows], dtype=object),
+            age=_as_float([r.age for r in rows]),
+            minutes=_as_float([r.minutes for r in rows]),
+        )
+
+    def reload(self, version: int) -> _Snapshot:
+        with self._reload_lock:
+            snap = self._snapshot
+            if snap is None or snap.version != version:
+                snap = self._load(version)
+                self._snapshot = snap          # swap atómico de la referencia
+        return snap
+
+    def ensure_fresh(self) -> _Snapshot:
+        version = data_versions.get("players").version
+        snap = self._snapshot
+        if snap is None or snap.version != version:
+            snap = self.reload(version)
+        return snap
+
+    async def aensure_fresh(self) -> _Snapshot:
+        version = (await data_versions.aget("players")).version
+        snap = self._snapshot
+        if snap is None or snap.version != version:
+            snap = await anyio.to_thread.run_sync(self.reload, version)
+        return snap
+
+    # ---------- búsqueda ----------
+    @staticmethod
+    def filter_mask(
+        snap: _Snapshot,
+        *,
+        nationality: Optional[str] = None,
+        position: Optional[str] = None,
+        min_minutes: int = 0,
+        max_age: Optional[int] = None,
+        exclude_clubs: Sequence[str] = (),
+    ) -> np.ndarray:
+        """Máscara de filtros compartidos (sin contar el jugador base)."""
+        mask = np.ones(len(snap), dtype=bool)
+        if exclude_clubs:
+            mask &= ~np.isin(snap.club, list(exclude_clubs))
+        if nationality:
+            mask &= snap.nationality == nationality
+        if position:
+            mask &= snap.position == position
+        if min_minutes:
+            mask &= snap.minutes >= min_minutes
+        if max_age:
+            mask &= snap.age <= max_age
+        return mask
+
+    @staticmethod
+    def top_k(
+        snap: _Snapshot, row: int, mask: np.ndarray, k: int
+    ) -> List[dict]:
+        """Top-k de la fila `row` entre las filas de `mask` (excluye su club y a sí mismo)."""
+        mask = mask.copy()
+        mask[row] = False
+        base_club = snap.club[row]
+        if base_club is not None:
+            mask &= snap.club != base_club
+
+        cand = np.flatnonzero(mask)
+        if cand.size == 0:
+            return []
+        sims = snap.matrix[cand] @ snap.matrix[row]
+        if cand.size > k:
+            part = np.argpartition(-sims, k - 1)[:k]
+        else:
+            part = np.arange(cand.size)
+        order = part[np.argsort(-sims[part], kind="stable")]
+
+        return [
+            {
+                "id": int(snap.ids[cand[i]]),
+                "full_name": snap.full_name[cand[i]],
+                "club": snap.club[cand[i]],
+                "dist": float(sims[i]),
+            }
+            for i in order
+        ]
+
+    @staticmethod
+    def top_k_batch(
+        snap: _Snapshot, rows: Sequence[int], mask: np.ndarray, k: int
+    ) -> List[List[dict]]:
+        """
+        Top-k de varias filas en una sola pasada matriz·matriz:
+        (b, d) · (d, c) → (b, c), y `argpartition` por fila.
+        """
+        cand = np.flatnonzero(mask)
+        if cand.size == 0 or not rows:
+            return [[] for _ in rows]
+
+        rows = np.asarray(rows)
+        sims = snap.matrix[rows] @ snap.matrix[cand].T          # (b, c)
+        # cada base excluye su propia fila y su club
+        sims[cand[None, :] == rows[:, None]] = -np.inf
+        base_clubs = snap.club[rows]
+        same_club = (snap.club[cand][None, :] == base_clubs[:, None]) & (
+            base_clubs[:, None] != None                            # noqa: E711
+        )
+        sims[same_club] = -np.inf
+
+        kk = min(k, cand.size)
+        part = np.argpartition(-sims, kk - 1, axis=1)[:, :kk]
+        part_sims = np.take_along_axis(sims, part, axis=1)
+        order = np.take_along_axis(part, np.argsort(-part_sims, axis=1, kind="stable"), axis=1)
+
+        out = []
+        for b in range(len(rows)):
+            hits = []
+            for j in order[b]:
+                sim = sims[b, j]
+                if not np.isfinite(sim):
+                    break
+                hits.append({
+                    "id": int(snap.ids[cand[j]]),
+                    "full_name": snap.full_name[cand[j]],
+                    "club": snap.club[cand[j]],
+                    "dist": float(sim),
+                })
+            out.append(hits)
+        return out
+
+    def similar(
+        self,
+        snap: _Snapshot,
+        player_id: int,
+        *,
+        k: int = 15,
+        **filters,
+    ) -> Optional[List[dict]]:
+        """None si el jugador no está en el índice (sin vector) → usar pgvector."""
+        row = snap.row_of.get(player_id)
+        if row is None:
+            return None
+        return self.top_k(snap, row, self.filter_mask(snap, **filters), k)
+
+    def similar_batch(
+        self,
+        snap: _Snapshot,
+        player_ids: Sequence[int],
+        *,
+        k: int = 15,
+        **filters,
+    ) -> Dict[int, List[dict]]:
+        """{player_id: vecinos} de los ids presentes en el índice (el resto se omite)."""
+        known = [pid for pid in dict.fromkeys(player_ids) if pid in snap.row_of]
+        rows = [snap.row_of[pid] for pid in known]
+        hits = self.top_k_batch(snap, rows, self.filter_mask(snap, **filters), k)
+        return dict(zip(known, hits))
+
+
+# instancia única del proceso
+player_index = PlayerIndex()
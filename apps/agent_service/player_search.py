@@ -0,0 +1,62 @@
+# apps/agent_service/player_search.py
+"""
+Resolución de nombres de jugador sobre `players.search_name` (minúsculas y sin
+tildes) con el índice GIN `gin_trgm_ops` de pg_trgm:
+
+  • subcadena  (`LIKE '%mbappe%'`)            → servida por el índice,
+  • aproximada (`search_name %> 'mbape'`)     → word-similarity, tolera erratas,
+
+ordenado por coincidencia exacta, word-similarity y similarity. "Mbappé",
+"mbappe" y "MBAPE" resuelven al mismo jugador.
+
+Lo usan `/players/players/search` (async) y la tool `player_stats` (sync).
+"""
+from __future__ import annotations
+
+from typing import Optional
+
+from sqlalchemy import func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from apps.ingestion.seed_and_ingest import Player, search_key
+
+
+def _search_stmt(key: str, *cols):
+    word_sim = func.word_similarity(key, Player.search_name)
+    return (
+        select(*cols, word_sim.label("score"))
+        .where(
+            or_(
+                Player.search_name.contains(key, autoescape=True),
+                Player.search_name.op("%>")(key),
+            )
+        )
+        .order_by(
+            (Player.search_name == key).desc(),
+            word_sim.desc(),
+            func.similarity(Player.search_name, key).desc(),
+            Player.id,
+        )
+    )
+
+
+async def search_players(db: AsyncSession, query: str, limit: int = 5) -> list[dict]:
+    """Candidatos para `query` ordenados por parecido (con su `score` 0–1)."""
+    key = search_key(query)
+    if not key:
+        return []
+    stmt = _search_stmt(
+        key, Player.id, Player.full_name, Player.club, Player.position
+    ).limit(limit)
+    rows = (await db.execute(stmt)).all()
+    return [{**r._mapping, "score": float(r.score)} for r in rows]
+
+
+def resolve_player(db: Session, name: str) -> Optional[Player]:
+    """Mejor coincidencia para `name` (None si nada se parece lo suficiente)."""
+    key = search_key(name)
+    if not key:
+        return None
+    row = db.execute(_search_stmt(key, Player).limit(1)).first()
+    return row[0] if row else None
@@ -1,6 +1,7 @@
 
 from typing import Dict, Any
-from apps.agent_service.db import get_session
+from apps.agent_service.db import session_scope
+from apps.agent_service.player_search import resolve_player
 from apps.ingestion.seed_and_ingest import Player       # tu modelo de jugadores
 from langchain.tools import tool
 import pandas as pd
@@ -15,14 +16,9 @@ def player_stats(player_name: str) -> Dict[str, any]:
       • team           → club
       • nationality    → país
     """
-    #with get_session() as db:
-    db = get_session()
-    try:
-        row = (
-            db.query(Player)
-                .filter(Player.full_name.ilike(player_name))
-                .first()
-        )
+    with session_scope() as db:
+        # nombre aproximado: sin tildes, mayúsculas ni erratas pequeñas
+        row = resolve_player(db, player_name)
         if row is None:
             raise ValueError(f"Jugador {player_name} no encontrado")
 
@@ -31,6 +27,7 @@ def player_stats(player_name: str) -> Dict[str, any]:
         stats.pop("_sa_instance_state", None)
         # elimina columnas no escalares que rompen tabulate/markdown
         stats.pop("feature_vector", None)
+        stats.pop("search_name", None)
 
         return {
             "role":        row.position,
@@ -39,5 +36,3 @@ def player_stats(player_name: str) -> Dict[str, any]:
             "team":        row.club,
             "nationality": row.nationality,
         }
-    finally:
-        db.close()
@@ -0,0 +1,272 @@
+# apps/agent_service/response_cache.py
+"""
+Caché de respuestas de la API en dos niveles:
+
+  1. local (en proceso): LRU con TTL, sin red ni serialización;
+  2. Redis (REDIS_URL): compartido entre workers/contenedores.
+
+La clave es  ruta + sellos de `data_versions` + parámetros normalizados, así
+que cuando la ingesta incrementa un sello ("players", "news") las entradas
+antiguas dejan de usarse sin tener que borrarlas (caducan solas por TTL).
+
+Se guarda el cuerpo JSON ya codificado: un acierto devuelve los bytes tal cual.
+Si Redis no responde, la API sigue funcionando sólo con el nivel local.
+
+Validadores HTTP: el ETag se deriva de la misma clave (ruta + sellos +
+parámetros) y Last-Modified del `updated_at` de los sellos, así que ambos se
+conocen sin ejecutar la consulta; un GET con `If-None-Match` /
+`If-Modified-Since` vigente recibe un 304 sin cuerpo.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from decimal import Decimal
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import orjson
+import redis.asyncio as aioredis
+from fastapi import Request, Response
+from redis.exceptions import RedisError
+
+from apps.agent_service.versions import DataVersion, data_versions
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
+CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "1") == "1"
+CACHE_PREFIX = os.getenv("RESPONSE_CACHE_PREFIX", "scout:resp")
+LOCAL_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_LOCAL_SIZE", "1024"))
+LOCAL_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_LOCAL_TTL", "30"))      # segundos
+REDIS_RETRY_AFTER = 30.0          # s sin intentar Redis tras un error de conexión
+
+# TTL (s) en Redis por ruta
+ROUTE_TTLS: Dict[str, int] = {
+    "players_batch": int(os.getenv("CACHE_TTL_PLAYERS_BATCH", "3600")),
+    "players_similar": int(os.getenv("CACHE_TTL_PLAYERS_SIMILAR", "3600")),
+    "player_news": int(os.getenv("CACHE_TTL_PLAYER_NEWS", "300")),
+    "player_percentiles": int(os.getenv("CACHE_TTL_PLAYER_PERCENTILES", "3600")),
+}
+DEFAULT_TTL = 300
+
+
+def normalize_params(params: dict) -> dict:
+    """None fuera, strings sin espacios sobrantes, listas ordenadas y sin duplicados."""
+    out = {}
+    for key, value in params.items():
+        if value is None or value == "" or value == [] or value == ():
+            continue
+        if isinstance(value, str):
+            value = value.strip()
+        elif isinstance(value, (list, tuple, set)):
+            value = sorted(set(value))
+        out[key] = value
+    return out
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """Comparación débil de `If-None-Match` (lista separada por comas o `*`)."""
+    bare = etag.removeprefix("W/")
+    for token in header.split(","):
+        token = token.strip()
+        if token == "*" or token.removeprefix("W/") == bare:
+            return True
+    return False
+
+
+def not_modified(request: Request, etag: str, last_modified: Optional[datetime]) -> bool:
+    """¿Tiene el cliente la versión actual? (`If-None-Match` manda sobre `If-Modified-Since`)."""
+    if request.method not in ("GET", "HEAD"):
+        return False
+    inm = request.headers.get("if-none-match")
+    if inm is not None:
+        return _etag_matches(inm, etag)
+    ims = request.headers.get("if-modified-since")
+    if ims and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(ims)
+        except (TypeError, ValueError):
+            return False
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+
+def _orjson_default(v):
+    """Lo que orjson no serializa por sí mismo (Decimal, vectores pgvector, arrays no contiguos…)."""
+    if isinstance(v, Decimal):
+        return float(v)
+    if isinstance(v, np.ndarray):
+        return v.tolist()
+    if hasattr(v, "to_list"):
+        return v.to_list()
+    raise TypeError
+
+
+def encode_json(payload) -> bytes:
+    """orjson con numpy nativo (float32, int64, ndarray) y datetimes en ISO-8601."""
+    return orjson.dumps(payload, default=_orjson_default, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+class _LocalTier:
+    """LRU con TTL por entrada (thread-safe: lo comparten event loop y threadpool)."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            hit = self._data.get(key)
+            if hit is None:
+                return None
+            expires, body = hit
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return body
+
+    def put(self, key: str, body: bytes, ttl: float) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + min(ttl, self.ttl), body)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class ResponseCache:
+    def __init__(self, url: str = REDIS_URL):
+        self.local = _LocalTier(LOCAL_CACHE_SIZE, LOCAL_CACHE_TTL)
+        self._redis = aioredis.from_url(
+            url, socket_timeout=0.25, socket_connect_timeout=0.25
+        )
+        self.hits = {"local": 0, "redis": 0}
+        self.misses = 0
+        self.redis_errors = 0
+        self._redis_down_until = 0.0
+
+    def _redis_failed(self) -> None:
+        self.redis_errors += 1
+        self._redis_down_until = time.monotonic() + REDIS_RETRY_AFTER
+
+    async def _stamps(self, domains: Iterable[str]) -> list[Tuple[str, DataVersion]]:
+        return [(d, await data_versions.aget(d)) for d in domains]
+
+    @staticmethod
+    def _key(route: str, params: dict, stamps) -> str:
+        digest = hashlib.sha1(
+            json.dumps(normalize_params(params), sort_keys=True, default=str).encode()
+        ).hexdigest()
+        versions = ".".join(f"{d}{v.version}" for d, v in stamps)
+        return f"{CACHE_PREFIX}:{route}:{versions}:{digest}"
+
+    async def key_for(self, route: str, params: dict, domains: Iterable[str]) -> str:
+        return self._key(route, params, await self._stamps(domains))
+
+    async def _redis_get(self, key: str) -> Optional[bytes]:
+        if time.monotonic() < self._redis_down_until:
+            return None
+        try:
+            return await self._redis.get(key)
+        except (RedisError, OSError):
+            self._redis_failed()
+            return None
+
+    async def _redis_set(self, key: str, body: bytes, ttl: int) -> None:
+        if time.monotonic() < self._redis_down_until:
+            return
+        try:
+            await self._redis.set(key, body, ex=ttl)
+        except (RedisError, OSError):
+            self._redis_failed()
+
+    async def get_or_set(
+        self,
+        route: str,
+        params: dict,
+        compute: Callable[[], Awaitable],
+        *,
+        domains: Iterable[str] = ("players",),
+        request: Optional[Request] = None,
+    ) -> Response:
+        """
+        Respuesta JSON de la caché o de `compute()` (que se guarda en ambos
+        niveles), con ETag / Last-Modified; 304 si el cliente ya la tiene.
+        """
+        stamps = await self._stamps(domains)
+        key = self._key(route, params, stamps)
+        etag = 'W/"' + hashlib.sha1(key.encode()).hexdigest()[:20] + '"'
+        modified = [v.updated_at for _, v in stamps if v.updated_at is not None]
+        last_modified = max(modified) if modified else None
+
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}   # revalidar siempre
+        if last_modified is not None:
+            headers["Last-Modified"] = format_datetime(
+                last_modified.astimezone(timezone.utc), usegmt=True
+            )
+        if request is not None and not_modified(request, etag, last_modified):
+            return Response(status_code=304, headers=headers)
+
+        if not CACHE_ENABLED:
+            return self._response(encode_json(await compute()), "bypass", headers)
+
+        ttl = ROUTE_TTLS.get(route, DEFAULT_TTL)
+
+        body = self.local.get(key)
+        if body is not None:
+            self.hits["local"] += 1
+            return self._response(body, "hit-local", headers)
+
+        body = await self._redis_get(key)
+        if body is not None:
+            self.hits["redis"] += 1
+            self.local.put(key, body, ttl)
+            return self._response(body, "hit-redis", headers)
+
+        self.misses += 1
+        body = encode_json(await compute())        # las HTTPException no se cachean
+        self.local.put(key, body, ttl)
+        await self._redis_set(key, body, ttl)
+        return self._response(body, "miss", headers)
+
+    @staticmethod
+    def _response(body: bytes, status: str, headers: dict) -> Response:
+        return Response(
+            body, media_type="application/json", headers={**headers, "X-Cache": status}
+        )
+
+    def stats(self) -> dict:
+        return {
+            "enabled": CACHE_ENABLED,
+            "local_entries": len(self.local),
+            "hits_local": self.hits["local"],
+            "hits_redis": self.hits["redis"],
+            "misses": self.misses,
+            "redis_errors": self.redis_errors,
+        }
+
+    async def close(self) -> None:
+        try:
+            await self._redis.aclose()
+        except (RedisError, OSError):
+            pass
+
+
+# instancia única del proceso
+response_cache = ResponseCache()
@@ -3,6 +3,7 @@ from __future__ import annotations
 
 import asyncio
 import json
+import os
 from typing import AsyncIterator, Dict, Optional, Literal, List
 
 from fastapi import APIRouter, Depends, Request
@@ -23,6 +24,24 @@ langchain.verbose = True
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
+# Hilos propios para el AgentExecutor. Sus tools esperan (api_calls) a
+# consultas que corren en el loop y que a su vez usan el threadpool por defecto
+# de anyio (encode, recarga de índices…): si los agentes ocuparan ese pool, con
+# carga se bloquearían entre sí hasta el timeout de la tool.
+AGENT_CONCURRENCY = int(os.getenv("AGENT_CONCURRENCY", "16"))
+_agent_limiter: Optional[anyio.CapacityLimiter] = None
+
+
+def _limiter() -> anyio.CapacityLimiter:
+    global _agent_limiter
+    if _agent_limiter is None:          # se crea en el worker, ya con loop
+        _agent_limiter = anyio.CapacityLimiter(AGENT_CONCURRENCY)
+    return _agent_limiter
+
+
+async def run_agent(agent, message: str) -> dict:
+    return await anyio.to_thread.run_sync(agent.invoke, {"input": message}, limiter=_limiter())
+
 
 # --------------------------------------------------------------------------- #
 #  Modelos Pydantic
@@ -75,12 +94,12 @@ class QueueStreamCallback(BaseCallbackHandler):
 #  End-point clásico (respuesta completa en un único JSON)
 # --------------------------------------------------------------------------- #
 @router.post("/", summary="Chat sin streaming")
-def chat(req: ChatRequest):
+async def chat(req: ChatRequest):
     agent = build_agent(
         user_id=req.user_id or "anon",
         messages=req.messages,            # ← histórico llega aquí
     )
-    result = agent.invoke({"input": req.message})
+    result = await run_agent(agent, req.message)
     return {"answer": result["output"]}
 
 
@@ -98,7 +117,7 @@ async def chat_stream(req: ChatRequest):
 
     # lanza el LLM en segundo plano para no bloquear
     async with anyio.create_task_group() as tg:
-        tg.start_soon(anyio.to_thread.run_sync, agent.invoke, {"input": req.message})
+        tg.start_soon(run_agent, agent, req.message)
 
     async def event_generator():
         async for tok in callback.token_iter():
@@ -1,81 +1,315 @@
-from typing import List
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import select, func, literal
-from pgvector.sqlalchemy import Vector
-from apps.agent_service.db import get_session
-from apps.ingestion.seed_and_ingest import FootballNews, player_news
-from sentence_transformers import SentenceTransformer
-import os, numpy as np
+from datetime import datetime
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func, and_, tuple_
+from apps.agent_service.db import get_async_session
+from apps.agent_service import faiss_index, vector_storage
+from apps.agent_service.response_cache import response_cache
+from apps.agent_service.embeddings import EMB_DIM, embedding_service, query_batcher
+from apps.agent_service.metrics import EMBED_SECONDS
+from apps.ingestion.seed_and_ingest import (
+    NEWS_TS_CONFIG,
+    FootballNews,
+    FootballNewsText,
+    player_news,
+)
 import sqlalchemy as sa
 
 router = APIRouter(prefix="/news", tags=["news"])
 
 # ---------- 1. Noticias por jugador ---------------------------------
-@router.get("/players/{player_id}/news")
-def player_news_endpoint(
+NEWS_FIELDS = {
+    "title": FootballNews.title,
+    "url": FootballNews.url,
+    "summary": FootballNews.summary,
+    "source": FootballNews.source_id,
+}
+DEFAULT_NEWS_FIELDS = ("title", "url", "summary", "source")
+
+
+def _parse_news_fields(fields: Optional[str], include_content: bool) -> list[str]:
+    """'title,summary' → ['title', 'summary'] (`id` y `published_at` van siempre)."""
+    if not fields:
+        wanted = list(DEFAULT_NEWS_FIELDS)
+    else:
+        wanted = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = sorted(set(wanted) - NEWS_FIELDS.keys() - {"id", "published_at", "content"})
+        if unknown:
+            raise HTTPException(422, f"Unknown fields: {', '.join(unknown)}")
+    if include_content:
+        wanted.append("content")
+    return [f for f in dict.fromkeys(wanted) if f not in ("id", "published_at")]
+
+
+async def fetch_player_news(
+    db: AsyncSession,
     player_id: int,
-    k: int = Query(5, ge=1, le=20),
-    db: Session = Depends(get_session),
-):
-    stmt = (
-        select(FootballNews)
-        .join(player_news, FootballNews.id == player_news.c.news_id)
+    *,
+    k: int = 5,
+    wanted: List[str] = DEFAULT_NEWS_FIELDS,
+    before: Optional[datetime] = None,
+    before_id: Optional[int] = None,
+) -> list[dict]:
+    """Página de noticias del jugador (la usan el endpoint y las tools en proceso)."""
+    # 1) página de enlaces (keyset): la sirve entera player_news_player_recent_idx
+    page = (
+        select(player_news.c.news_id, player_news.c.published_at)
         .where(player_news.c.player_id == player_id)
-        .order_by(FootballNews.published_at.desc())
+        .order_by(player_news.c.published_at.desc(), player_news.c.news_id.desc())
         .limit(k)
     )
-    rows = db.execute(stmt).scalars().all()
+    if before is not None:
+        page = page.where(
+            tuple_(player_news.c.published_at, player_news.c.news_id)
+            < tuple_(before, before_id)
+        )
+    page = page.subquery("page")
+
+    # 2) sólo las k filas de la página se buscan en football_news (por PK)
+    stmt = (
+        select(
+            page.c.news_id,
+            page.c.published_at,
+            *[NEWS_FIELDS[f].label(f) for f in wanted if f in NEWS_FIELDS],
+        )
+        .join(
+            FootballNews,
+            and_(
+                FootballNews.id == page.c.news_id,
+                FootballNews.published_at == page.c.published_at,
+            ),
+        )
+        .order_by(page.c.published_at.desc(), page.c.news_id.desc())
+    )
+    if "content" in wanted:
+        stmt = stmt.add_columns(FootballNewsText.article_text.label("content")).outerjoin(
+            FootballNewsText,
+            and_(
+                FootballNewsText.news_id == page.c.news_id,
+                FootballNewsText.published_at == page.c.published_at,
+            ),
+        )
+
+    rows = (await db.execute(stmt)).all()
     return [
         {
-            "title": n.title,
-            "url": n.url,
-            "summary": n.summary,
-            "content":n.article_text,
-            "published_at": n.article_text,
-            "source": n.source_id,
+            "id": n.news_id,
+            "published_at": n.published_at,
+            **{f: getattr(n, f) for f in wanted},
         }
         for n in rows
     ]
 
 
+@router.get("/players/{player_id}/news")
+async def player_news_endpoint(
+    player_id: int,
+    request: Request,
+    k: int = Query(5, ge=1, le=20),
+    include_content: bool = Query(
+        False, description="Incluye el texto completo (tabla fría football_news_text)"
+    ),
+    fields: Optional[str] = Query(
+        None,
+        description="Campos separados por coma: title,url,summary,source,content "
+                    "(`id` y `published_at` siempre). Ej.: `title,published_at` para titulares",
+    ),
+    before: Optional[datetime] = Query(
+        None, description="Paginación: `published_at` de la última noticia recibida"
+    ),
+    before_id: Optional[int] = Query(
+        None, description="Paginación: `id` de la última noticia recibida"
+    ),
+    db: AsyncSession = Depends(get_async_session),
+):
+    wanted = _parse_news_fields(fields, include_content)
+    if (before is None) != (before_id is None):
+        raise HTTPException(422, "`before` and `before_id` must be sent together")
+
+    return await response_cache.get_or_set(
+        "player_news",
+        dict(player_id=player_id, k=k, fields=wanted, before=before, before_id=before_id),
+        lambda: fetch_player_news(
+            db, player_id, k=k, wanted=wanted, before=before, before_id=before_id
+        ),
+        domains=("news",),
+        request=request,
+    )
+
+
 # ---------- 2. Búsqueda semántica global ----------------------------
 
+# El embedder es el compartido del proceso (apps/agent_service/embeddings.py):
+# se carga una vez, se calienta al arrancar y cachea las consultas repetidas.
+# Las consultas concurrentes se agrupan en un solo forward (QueryBatcher).
 
-# Reutiliza el embedder que ya usas en seed_and_ingest
-_EMB_MODEL = os.getenv("EMB_MODEL", "sentence-transformers/all-mpnet-base-v2")
-_embedder = SentenceTransformer(_EMB_MODEL)
+RRF_K = 60                # constante de Reciprocal Rank Fusion
 
-EMB_DIM = 768  # la misma dimensión que usaste al crear la columna embedding
 
-@router.get("/search")
-def news_search_endpoint(
-    query: str = Query(..., min_length=3),
-    limit: int = Query(10, ge=1, le=50),
-    db: Session = Depends(get_session),
-):
-    q_emb = _embedder.encode(query, convert_to_numpy=True).tolist()  # → list[float]
+def _news_filters(
+    date_from: Optional[datetime],
+    date_to: Optional[datetime],
+    sources: List[str],
+    player_id: Optional[int],
+) -> list:
+    """
+    Filtros que PostgreSQL empuja a los índices: el rango de `published_at`
+    poda particiones, `source_id` usa football_news_source_recent_idx y el
+    jugador es un semi-join sobre player_news (PK / índice por jugador).
+    """
+    conds = []
+    if date_from is not None:
+        conds.append(FootballNews.published_at >= date_from)
+    if date_to is not None:
+        conds.append(FootballNews.published_at < date_to)
+    if sources:
+        conds.append(FootballNews.source_id.in_(sources))
+    if player_id is not None:
+        conds.append(
+            sa.exists().where(
+                player_news.c.player_id == player_id,
+                player_news.c.news_id == FootballNews.id,
+                player_news.c.published_at == FootballNews.published_at,
+            )
+        )
+    return conds
 
-    query_vec = sa.cast(literal(q_emb), Vector(EMB_DIM))
 
-    stmt = (
-        select(
-            FootballNews,
-            func.cosine_distance(FootballNews.embedding, query_vec).label("dist")
+def _news_item(n, **scores) -> dict:
+    return {
+        "title": n.title,
+        "url": n.url,
+        "summary": n.summary,
+        "published_at": n.published_at,
+        "source": n.source_id,
+        **scores,
+    }
+
+
+def rrf_fuse(rankings: List[list], k: int = RRF_K) -> dict:
+    """{id: Σ 1/(k + rank)} sobre varias listas ordenadas de ids."""
+    scores: dict = {}
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking, start=1):
+            scores[item_id] = scores.get(item_id, 0.0) + 1.0 / (k + rank)
+    return scores
+
+
+async def search_news(
+    db: AsyncSession,
+    query: str,
+    *,
+    limit: int = 10,
+    mode: str = "vector",
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    sources: List[str] = (),
+    player_id: Optional[int] = None,
+) -> list[dict]:
+    """Búsqueda vector / léxica / híbrida (la usan el endpoint y las tools en proceso)."""
+    filters = _news_filters(date_from, date_to, sources, player_id)
+    cols = [
+        FootballNews.id,
+        FootballNews.title,
+        FootballNews.url,
+        FootballNews.summary,
+        FootballNews.published_at,
+        FootballNews.source_id,
+    ]
+    # en modo híbrido cada rama aporta más candidatos de los que se devuelven
+    n_cand = limit if mode == "vector" else max(3 * limit, 30)
+
+    vec_rows, lex_rows = [], []
+    if mode in ("vector", "hybrid"):
+        with EMBED_SECONDS.labels("query").time():
+            q_vec = await query_batcher.encode(query)
+
+        # 1️⃣ FAISS (sin filtros): ids + similitud desde el índice, y sólo esas filas
+        if faiss_index.FAISS_ENABLED and not filters:
+            ids, sims = await faiss_index.search_news(q_vec, n_cand)
+            rows = (await db.execute(select(*cols).where(FootballNews.id.in_(ids)))).all() if ids else []
+            by_id = {r.id: r for r in rows}
+            # archivadas tras construir el índice → se omiten
+            vec_rows = [(by_id[i], 1.0 - sim) for i, sim in zip(ids, sims) if i in by_id]
+
+        # 2️⃣ pgvector (índice HNSW) con los filtros en la misma consulta; con
+        #    halfvec/binary: candidatos por el índice compacto + reordenación exacta
+        else:
+            await vector_storage.prepare_scan(
+                db, n_cand, vector_storage.NEWS_VECTOR_STORAGE, filtered=bool(filters)
+            )
+            stmt = vector_storage.nearest(
+                cols,
+                FootballNews.embedding,
+                q_vec.tolist(),
+                EMB_DIM,
+                vector_storage.NEWS_VECTOR_STORAGE,
+                [FootballNews.embedding.is_not(None), *filters],
+                n_cand,
+            )
+            vec_rows = [(r, float(r.dist)) for r in (await db.execute(stmt)).all()]
+
+    if mode in ("lexical", "hybrid"):
+        # 3️⃣ full-text sobre el índice GIN de search_tsv
+        ts_config = sa.literal_column(f"'{NEWS_TS_CONFIG}'::regconfig")
+        tsq = func.websearch_to_tsquery(ts_config, query)
+        rank = func.ts_rank_cd(FootballNews.search_tsv, tsq)
+        stmt = (
+            select(*cols, rank.label("rank"))
+            .where(FootballNews.search_tsv.op("@@")(tsq), *filters)
+            .order_by(rank.desc(), FootballNews.published_at.desc())
+            .limit(n_cand)
         )
-        .order_by("dist")
-        .limit(limit)
-    )
-    rows = db.execute(stmt).all()
+        lex_rows = [(r, float(r.rank)) for r in (await db.execute(stmt)).all()]
+
+    if mode == "vector":
+        return [_news_item(n, distance=d) for n, d in vec_rows[:limit]]
+    if mode == "lexical":
+        return [_news_item(n, rank=rk) for n, rk in lex_rows[:limit]]
 
+    # 4️⃣ híbrido: Reciprocal Rank Fusion de ambas listas
+    scores = rrf_fuse([[n.id for n, _ in vec_rows], [n.id for n, _ in lex_rows]])
+    rows = {n.id: n for n, _ in vec_rows + lex_rows}
+    dists = {n.id: d for n, d in vec_rows}
+    best = sorted(scores, key=scores.get, reverse=True)[:limit]
     return [
-        {
-            "title": n.title,
-            "url": n.url,
-            "summary": n.summary,
-            "published_at": n.published_at,
-            "distance": float(dist),
-            "source": n.source_id,
-        }
-        for n, dist in rows
+        _news_item(rows[i], distance=dists.get(i), score=round(scores[i], 6))
+        for i in best
     ]
+
+
+@router.get("/search")
+async def news_search_endpoint(
+    query: str = Query(..., min_length=3),
+    limit: int = Query(10, ge=1, le=50),
+    mode: str = Query(
+        "vector",
+        pattern="^(vector|lexical|hybrid)$",
+        description="vector (embeddings) · lexical (full-text) · hybrid (RRF de ambos)",
+    ),
+    date_from: Optional[datetime] = Query(None, description="published_at ≥ date_from"),
+    date_to: Optional[datetime] = Query(None, description="published_at < date_to"),
+    source: Optional[str] = Query(None, description="source_id(s) separados por coma"),
+    player_id: Optional[int] = Query(None, description="Sólo noticias enlazadas al jugador"),
+    db: AsyncSession = Depends(get_async_session),
+):
+    sources = [x.strip() for x in source.split(",") if x.strip()] if source else []
+    return await search_news(
+        db,
+        query,
+        limit=limit,
+        mode=mode,
+        date_from=date_from,
+        date_to=date_to,
+        sources=sources,
+        player_id=player_id,
+    )
+
+
+@router.get("/search/cache-stats", summary="Estadísticas de la caché de embeddings de consulta")
+def news_search_cache_stats():
+    stats = embedding_service.stats()
+    stats["batches"] = query_batcher.batches
+    stats["batched_queries"] = query_batcher.batched_queries
+    return stats
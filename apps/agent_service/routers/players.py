@@ -1,56 +1,72 @@
-from fastapi import APIRouter, Depends, Query, Body, HTTPException
-from sqlalchemy import select, func, literal, cast
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Query, Body, HTTPException, Request
+from sqlalchemy import select, func, true
+from sqlalchemy.orm import aliased
+from pydantic import BaseModel, Field
+from sqlalchemy.ext.asyncio import AsyncSession
 import numpy as np
 from pgvector.sqlalchemy import Vector
-from apps.ingestion.seed_and_ingest import Player   # modelo ya existente
-from apps.agent_service.db import get_session
-from typing import List
-from decimal import Decimal
-from pgvector.sqlalchemy import Vector as PGVector
+from apps.ingestion.seed_and_ingest import (   # modelos ya existentes
+    FEATURE_COLS,
+    NEIGHBORS_TOP_N,
+    PLAYER_DIM,
+    PLAYER_VEC_INDEX,
+    Player,
+    player_metric_quantiles,
+    player_neighbors,
+)
+from apps.agent_service.db import AsyncSessionLocal, get_async_session
+from apps.agent_service.player_index import PLAYER_INDEX_ENABLED, player_index
+from apps.agent_service import faiss_index, player_search, vector_storage
+from apps.agent_service.response_cache import encode_json, response_cache
+from typing import AsyncIterator, List, Optional
+import io
+from fastapi.responses import StreamingResponse
 
+try:
+    import pyarrow as pa
+except ImportError:                     # export Arrow opcional
+    pa = None
 
-def _serialize(v):
-    """Convierte cualquier valor de SQLAlchemy a algo JSON-safe."""
-    if v is None:
-        return None
-
-    # ── vectores o secuencias ───────────────────────────────
-    if isinstance(v, (PGVector, list, tuple, np.ndarray)):
-        # Asegura que *cada* elemento sea float/int nativo
-        return [ _serialize(x) for x in list(v) ]
 
-    # ── escalares numpy (np.float32, np.int64, …) ───────────
-    if isinstance(v, np.generic):
-        return v.item()           # → float / int de Python
+# columnas que se pueden pedir en `fields` (nombre → columna de la tabla)
+PLAYER_COLUMNS = {c.name: c for c in Player.__table__.columns}
+PLAYER_COLUMNS.pop("search_name")          # columna interna de búsqueda
+VECTOR_FIELDS = {"feature_vector"}
 
-    # ── Decimals opcionales ─────────────────────────────────
-    if isinstance(v, Decimal):
-        return float(v)
 
-    # ── tipos ya serializables (str, int, float, datetime…) ─
-    return v
+def _batch_columns(fields: Optional[List[str]], include_vector: bool) -> list:
+    """Proyección SQL para /players/batch (`id` siempre incluido)."""
+    if not fields:
+        return [c for name, c in PLAYER_COLUMNS.items() if include_vector or name not in VECTOR_FIELDS]
 
-def player_to_dict(p: Player) -> dict:
-    return {c.name: _serialize(getattr(p, c.name)) for c in Player.__table__.columns}
+    unknown = sorted(set(fields) - PLAYER_COLUMNS.keys())
+    if unknown:
+        raise HTTPException(422, f"Unknown fields: {', '.join(unknown)}")
+    names = ["id"] + [f for f in dict.fromkeys(fields) if f != "id"]
+    return [PLAYER_COLUMNS[n] for n in names]
 
 router = APIRouter(prefix="/players", tags=["players"])
 
-@router.get("/{player_id}/similar")
-def similar_players(
+def _parse_clubs(exclude_club: str | None) -> list[str]:
+    """'Club A, Club B' → ['Club A', 'Club B']"""
+    if not exclude_club:
+        return []
+    return [c.strip() for c in exclude_club.split(",") if c.strip()]
+
+
+async def _similar_players_sql(
+    db: AsyncSession,
     player_id: int,
-    nationality: str | None = Query(None),
-    position: str | None = Query(None),
-    min_minutes: int = Query(0, ge=0),
-    max_age: int | None = Query(None, ge=0),
-    exclude_club: str | None = Query(
-        None,
-        description="Lista de clubes a excluir, separados por coma"
-    ),
-    k: int = Query(15, le=100),
-    db: Session = Depends(get_session),
-):
-    base = db.get(Player, player_id)
+    *,
+    k: int,
+    nationality: str | None = None,
+    position: str | None = None,
+    min_minutes: int = 0,
+    max_age: int | None = None,
+    exclude_clubs: List[str] = (),
+) -> list[dict]:
+    """Búsqueda con pgvector (operador `<=>`, servido por el índice ivfflat)."""
+    base = await db.get(Player, player_id)
     if not base:
         raise HTTPException(404, "Player not found")
     
@@ -64,10 +80,8 @@ def similar_players(
     filters.append(Player.club != base.club)
 
     # ⬇️ 2. Excluir club(es) pasados por query
-    if exclude_club:
-        clubs_to_exclude = [c.strip() for c in exclude_club.split(",") if c.strip()]
-        if clubs_to_exclude:
-            filters.append(Player.club.notin_(clubs_to_exclude))
+    if exclude_clubs:
+        filters.append(Player.club.notin_(exclude_clubs))
 
     # Resto de filtros de inclusión
     if nationality:
@@ -79,53 +93,435 @@ def similar_players(
     if max_age:
         filters.append(Player.age <= max_age)
 
-    dist_expr = func.cosine_distance(
-                Player.feature_vector,
-                cast(literal(base_vec), Vector(43))
-            )
+    # coseno exacto; con PLAYER_VECTOR_STORAGE=halfvec, candidatos por el índice halfvec
+    await vector_storage.prepare_scan(
+        db, k, vector_storage.PLAYER_VECTOR_STORAGE, filtered=True,
+        ivfflat_index=PLAYER_VEC_INDEX,
+    )
+    stmt = vector_storage.nearest(
+        [Player.id, Player.full_name, Player.club],
+        Player.feature_vector,
+        base_vec,
+        PLAYER_DIM,
+        vector_storage.PLAYER_VECTOR_STORAGE,
+        filters,
+        k,
+    )
+
+    rows = (await db.execute(stmt)).all()
+
+    return [
+        {
+            "id": r.id,
+            "full_name": r.full_name,
+            "club": r.club,
+            "dist": 1 - float(r.dist)       # similitud
+        }
+        for r in rows
+    ]
 
-    sim_expr  = 1 - dist_expr                  
 
+async def _similar_from_neighbors(
+    db: AsyncSession,
+    player_id: int,
+    *,
+    k: int,
+    nationality: str | None = None,
+    position: str | None = None,
+    min_minutes: int = 0,
+    max_age: int | None = None,
+    exclude_clubs: List[str] = (),
+) -> list[dict] | None:
+    """
+    Top-k desde `player_neighbors` (precalculada en la ingesta, dentro de la
+    posición del jugador). Sólo vale si se pide su misma posición; el resto de
+    filtros se aplica sobre la lista. None → hay que buscar en vivo.
+    """
+    if not position or k > NEIGHBORS_TOP_N:
+        return None
+
+    base = aliased(Player, name="base")
+    n = aliased(Player, name="n")
     stmt = (
         select(
-            Player,
-            sim_expr.label("similarity")        
+            base.position.label("base_position"),
+            n.id, n.full_name, n.club, n.nationality, n.minutes, n.age,
+            player_neighbors.c.similarity,
         )
+        .join(base, base.id == player_neighbors.c.player_id)
+        .join(n, n.id == player_neighbors.c.neighbor_id)
+        .where(player_neighbors.c.player_id == player_id)
+        .order_by(player_neighbors.c.rank)
+    )
+    rows = (await db.execute(stmt)).all()
+    if not rows or rows[0].base_position != position:
+        return None
+
+    hits = [
+        {"id": r.id, "full_name": r.full_name, "club": r.club, "dist": float(r.similarity)}
+        for r in rows
+        if (not nationality or r.nationality == nationality)
+        and (not min_minutes or (r.minutes is not None and r.minutes >= min_minutes))
+        and (not max_age or (r.age is not None and r.age <= max_age))
+        and r.club not in exclude_clubs
+    ]
+    # lista truncada en NEIGHBORS_TOP_N y los filtros dejan < k → no es fiable
+    if len(hits) < k and len(rows) >= NEIGHBORS_TOP_N:
+        return None
+    return hits[:k]
+
+
+async def find_similar_players(
+    db: AsyncSession, player_id: int, *, k: int = 15, **filters
+) -> list[dict]:
+    """Top-k similares (lo usan el endpoint y las tools del agente en proceso)."""
+    # 0️⃣ vecinos precalculados (misma posición que el jugador base)
+    hits = await _similar_from_neighbors(db, player_id, k=k, **filters)
+    if hits is not None:
+        return hits
+
+    # 1️⃣ índice en memoria, sin ida y vuelta a la BD:
+    #    FAISS (VECTOR_BACKEND=faiss, filtros como selector de ids) o NumPy exacto
+    if faiss_index.FAISS_ENABLED:
+        hits = await faiss_index.similar_players(player_id, k=k, **filters)
+    elif PLAYER_INDEX_ENABLED:
+        snap = await player_index.aensure_fresh()
+        hits = player_index.similar(snap, player_id, k=k, **filters)
+    if hits is not None:
+        return hits
+
+    # 2️⃣ fallback: pgvector (jugador sin vector en el índice / índice desactivado)
+    return await _similar_players_sql(db, player_id, k=k, **filters)
+
+
+@router.get("/{player_id}/similar")
+async def similar_players(
+    player_id: int,
+    request: Request,
+    nationality: str | None = Query(None),
+    position: str | None = Query(None),
+    min_minutes: int = Query(0, ge=0),
+    max_age: int | None = Query(None, ge=0),
+    exclude_club: str | None = Query(
+        None,
+        description="Lista de clubes a excluir, separados por coma"
+    ),
+    k: int = Query(15, le=100),
+    db: AsyncSession = Depends(get_async_session),
+):
+    filters = dict(
+        nationality=nationality,
+        position=position,
+        min_minutes=min_minutes,
+        max_age=max_age,
+        exclude_clubs=_parse_clubs(exclude_club),
+    )
+
+    return await response_cache.get_or_set(
+        "players_similar",
+        dict(player_id=player_id, k=k, **filters),
+        lambda: find_similar_players(db, player_id, k=k, **filters),
+        request=request,
+    )
+
+def _percentile(quantiles: List[float], value: float) -> float:
+    """Rango percentil 0–100 de `value` sobre los cuantiles p0…p100 (empates → rango medio)."""
+    q = np.asarray(quantiles)
+    lo = np.searchsorted(q, value, side="left")
+    hi = np.searchsorted(q, value, side="right")
+    pct = 100.0 * ((lo + hi) / 2 - 0.5) / (len(q) - 1)
+    return round(float(np.clip(pct, 0.0, 100.0)), 1)
+
+
+@router.get("/{player_id}/percentiles", summary="Percentiles del jugador frente a su posición / liga")
+async def player_percentiles(
+    player_id: int,
+    request: Request,
+    scope: str = Query("position", pattern="^(position|league|all)$"),
+    db: AsyncSession = Depends(get_async_session),
+):
+    async def compute():
+        cols = [Player.position, Player.league] + [PLAYER_COLUMNS[c] for c in FEATURE_COLS]
+        row = (await db.execute(select(*cols).where(Player.id == player_id))).first()
+        if row is None:
+            raise HTTPException(404, "Player not found")
+
+        group = "" if scope == "all" else (getattr(row, scope) or "")
+        q = player_metric_quantiles.c
+        stmt = select(q.metric, q.n, q.quantiles).where(q.scope == scope, q.group == group)
+        by_metric = {r.metric: r for r in (await db.execute(stmt)).all()}
+        if not by_metric:
+            raise HTTPException(404, f"No percentiles for {scope} '{group}'")
+
+        metrics = {}
+        for col in FEATURE_COLS:
+            r = by_metric.get(col)
+            if r is None:
+                continue
+            value = getattr(row, col)
+            metrics[col] = {
+                "value": value,
+                "percentile": None if value is None else _percentile(r.quantiles, value),
+                "p50": r.quantiles[50],
+                "p90": r.quantiles[90],
+                "max": r.quantiles[-1],
+                "n": r.n,
+            }
+        return {"player_id": player_id, "scope": scope, "group": group, "metrics": metrics}
+
+    return await response_cache.get_or_set(
+        "player_percentiles", dict(player_id=player_id, scope=scope), compute,
+        request=request,
+    )
+
+
+class SimilarBatchRequest(BaseModel):
+    """Varios jugadores base con filtros compartidos."""
+    base_ids: List[int] = Field(..., min_length=1, max_length=200, examples=[[274, 311, 658]])
+    nationality: Optional[str] = None
+    position: Optional[str] = None
+    min_minutes: int = Field(0, ge=0)
+    max_age: Optional[int] = Field(None, ge=0)
+    exclude_club: Optional[str] = Field(
+        None, description="Lista de clubes a excluir, separados por coma"
+    )
+    k: int = Field(15, ge=1, le=100)
+
+
+async def _similar_batch_sql(
+    db: AsyncSession,
+    base_ids: List[int],
+    *,
+    k: int,
+    nationality: str | None = None,
+    position: str | None = None,
+    min_minutes: int = 0,
+    max_age: int | None = None,
+    exclude_clubs: List[str] = (),
+) -> dict[int, list[dict]]:
+    """Una sola sentencia: `players b CROSS JOIN LATERAL (top-k de cada b)`."""
+    b = aliased(Player, name="b")
+    p = aliased(Player, name="p")
+
+    dist_expr = p.feature_vector.cosine_distance(b.feature_vector)
+    filters = [p.id != b.id, p.club != b.club, p.feature_vector.is_not(None)]
+    if exclude_clubs:
+        filters.append(p.club.notin_(exclude_clubs))
+    if nationality:
+        filters.append(p.nationality == nationality)
+    if position:
+        filters.append(p.position == position)
+    if min_minutes:
+        filters.append(p.minutes >= min_minutes)
+    if max_age:
+        filters.append(p.age <= max_age)
+
+    neighbours = (
+        select(p.id, p.full_name, p.club, (1 - dist_expr).label("similarity"))
         .where(*filters)
-        .order_by(sim_expr.desc())              
+        .order_by(dist_expr)
         .limit(k)
+        .lateral("n")
+    )
+    stmt = (
+        select(b.id.label("base_id"), neighbours)
+        .select_from(b)
+        .join(neighbours, true())
+        # base sin vector → similitud NULL; se queda fuera y el endpoint devuelve []
+        .where(b.id.in_(base_ids), b.feature_vector.is_not(None))
+        .order_by(b.id, neighbours.c.similarity.desc())
     )
 
-    rows = db.execute(stmt).all()
+    out: dict[int, list[dict]] = {}
+    for r in (await db.execute(stmt)).all():
+        out.setdefault(r.base_id, []).append(
+            {"id": r.id, "full_name": r.full_name, "club": r.club, "dist": float(r.similarity)}
+        )
+    return out
+
+
+@router.post("/similar/batch", summary="Jugadores similares para varios jugadores base")
+async def similar_players_batch(
+    req: SimilarBatchRequest,
+    db: AsyncSession = Depends(get_async_session),
+):
+    filters = dict(
+        nationality=req.nationality,
+        position=req.position,
+        min_minutes=req.min_minutes,
+        max_age=req.max_age,
+        exclude_clubs=_parse_clubs(req.exclude_club),
+    )
+
+    found: dict[int, list[dict]] = {}
+    if PLAYER_INDEX_ENABLED:
+        snap = await player_index.aensure_fresh()
+        found = player_index.similar_batch(snap, req.base_ids, k=req.k, **filters)
+
+    missing = [pid for pid in req.base_ids if pid not in found]
+    if missing:
+        found.update(await _similar_batch_sql(db, missing, k=req.k, **filters))
 
     return [
-        {
-            "id": p.id,
-            "full_name": p.full_name,
-            "club": p.club,
-            "dist": float(dist)     
-        }
-        for p, dist in rows
+        {"base_id": pid, "similar": found.get(pid, [])}
+        for pid in dict.fromkeys(req.base_ids)
     ]
 
-@router.post("/batch", summary="Devuelve todas las métricas de varios jugadores")
-def players_batch(
+
+async def _players_batch(
+    db: AsyncSession,
+    ids: List[int],
+    fields: Optional[List[str]],
+    include_vector: bool,
+    request: Optional[Request] = None,
+):
+    cols = _batch_columns(fields, include_vector)
+
+    async def compute():
+        # sólo las columnas pedidas; numpy/datetime los serializa orjson directamente
+        rows = (await db.execute(select(*cols).where(Player.id.in_(ids)))).all()
+
+        if not rows:
+            raise HTTPException(status_code=404, detail="No players found")
+
+        return [dict(r._mapping) for r in rows]
+
+    return await response_cache.get_or_set(
+        "players_batch", {"ids": ids, "fields": [c.name for c in cols]}, compute,
+        request=request,
+    )
+
+
+@router.post("/batch", summary="Devuelve las métricas de varios jugadores")
+async def players_batch(
     ids: List[int] = Body(..., embed=True, example=[274, 311, 658]),
-    db: Session = Depends(get_session),
+    fields: Optional[List[str]] = Body(
+        None,
+        embed=True,
+        description="Columnas a devolver (por defecto todas); `id` siempre se incluye",
+        example=["full_name", "club", "position", "goals_per90"],
+    ),
+    include_vector: bool = Body(
+        True, embed=True, description="Sin `fields`: incluir también `feature_vector`"
+    ),
+    db: AsyncSession = Depends(get_async_session),
+):
+    return await _players_batch(db, ids, fields, include_vector)
+
+
+@router.get("/batch", summary="Igual que POST /batch, cacheable por HTTP (ETag / 304)")
+async def players_batch_get(
+    request: Request,
+    ids: str = Query(..., description="ids separados por coma", example="274,311,658"),
+    fields: Optional[str] = Query(None, description="Columnas separadas por coma"),
+    include_vector: bool = Query(True),
+    db: AsyncSession = Depends(get_async_session),
 ):
-    rows = db.query(Player).filter(Player.id.in_(ids)).all()
+    try:
+        id_list = [int(x) for x in ids.split(",") if x.strip()]
+    except ValueError:
+        raise HTTPException(422, "ids must be a comma-separated list of integers")
+    field_list = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    return await _players_batch(db, id_list, field_list, include_vector, request)
+
+# ---------- Export masivo (streaming) ------------------------------
+EXPORT_CHUNK = 1000          # filas por lote leído del cursor de servidor
+
+
+def _arrow_type(col):
+    if isinstance(col.type, Vector):
+        return pa.list_(pa.float32())
+    py = col.type.python_type
+    if py is int:
+        return pa.int64()
+    if py is float:
+        return pa.float64()
+    return pa.string()
 
-    if not rows:
-        raise HTTPException(status_code=404, detail="No players found")
 
-    return [player_to_dict(p) for p in rows]
+async def _export_rows(stmt) -> AsyncIterator[list]:
+    """Lotes de filas desde un cursor de servidor (memoria constante)."""
+    # sesión propia: la de la dependencia se cierra antes de terminar el streaming
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(stmt.execution_options(yield_per=EXPORT_CHUNK))
+        async for chunk in result.mappings().partitions(EXPORT_CHUNK):
+            yield chunk
+
+
+async def _ndjson(stmt) -> AsyncIterator[bytes]:
+    async for chunk in _export_rows(stmt):
+        # mismo encoder que la caché (Decimal, vectores pgvector…): con la cabecera
+        # 200 ya enviada, un tipo no serializable dejaría el cuerpo truncado
+        yield b"".join(encode_json(dict(r)) + b"\n" for r in chunk)
+
+
+async def _arrow_ipc(stmt, cols) -> AsyncIterator[bytes]:
+    schema = pa.schema([(c.name, _arrow_type(c)) for c in cols])
+    buf = io.BytesIO()
+    writer = pa.ipc.new_stream(buf, schema)
+
+    def drain() -> bytes:                   # cada lote se envía y se descarta
+        data = buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+        return data
+
+    async for chunk in _export_rows(stmt):
+        columns = {c.name: [r[c.name] for r in chunk] for c in cols}
+        for name, values in columns.items():
+            if pa.types.is_list(schema.field(name).type):
+                columns[name] = [None if v is None else np.asarray(v, dtype=np.float32) for v in values]
+        writer.write_batch(pa.RecordBatch.from_pydict(columns, schema=schema))
+        yield drain()
+    writer.close()
+    yield drain()
+
+
+@router.get("/export", summary="Exporta (streaming) jugadores filtrados en NDJSON o Arrow IPC")
+async def export_players(
+    format: str = Query("ndjson", pattern="^(ndjson|arrow)$"),
+    fields: Optional[str] = Query(None, description="Columnas separadas por coma (por defecto todas)"),
+    include_vector: bool = Query(False),
+    nationality: str | None = Query(None),
+    position: str | None = Query(None),
+    league: str | None = Query(None),
+    min_minutes: int = Query(0, ge=0),
+    max_age: int | None = Query(None, ge=0),
+    exclude_club: str | None = Query(None, description="Clubes a excluir, separados por coma"),
+):
+    field_list = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    cols = _batch_columns(field_list, include_vector)
+
+    conds = []
+    if nationality:
+        conds.append(Player.nationality == nationality)
+    if position:
+        conds.append(Player.position == position)
+    if league:
+        conds.append(Player.league == league)
+    if min_minutes:
+        conds.append(Player.minutes >= min_minutes)
+    if max_age:
+        conds.append(Player.age <= max_age)
+    clubs = _parse_clubs(exclude_club)
+    if clubs:
+        conds.append(Player.club.notin_(clubs))
+    stmt = select(*cols).where(*conds).order_by(Player.id)
+
+    if format == "arrow":
+        if pa is None:
+            raise HTTPException(501, "pyarrow is not installed")
+        return StreamingResponse(
+            _arrow_ipc(stmt, cols),
+            media_type="application/vnd.apache.arrow.stream",
+            headers={"Content-Disposition": 'attachment; filename="players.arrows"'},
+        )
+    return StreamingResponse(_ndjson(stmt), media_type="application/x-ndjson")
+
 
 @router.get("/players/search")
-def search_players(query: str, limit: int = 5, db: Session = Depends(get_session)):
-    rows = (
-        db.query(Player.id, Player.full_name, Player.club, Player.position)
-          .filter(Player.full_name.ilike(f"%{query}%"))
-          .limit(limit)
-          .all()
-    )
-    return [dict(r._mapping) for r in rows]
\ No newline at end of file
+async def search_players(
+    query: str, limit: int = 5, db: AsyncSession = Depends(get_async_session)
+):
+    # trigramas sobre el nombre normalizado (ignora tildes, tolera erratas)
+    return await player_search.search_players(db, query, limit)
@@ -0,0 +1,164 @@
+# apps/agent_service/serve.py
+"""
+Servidor multi-worker de la API con precarga y fork (copy-on-write).
+
+`uvicorn --workers N` arranca N intérpretes independientes: cada uno importa
+la app y carga su propia copia del SentenceTransformer, de modo que la RAM
+crece linealmente con los workers. Aquí el proceso padre:
+
+  1. importa la app (FastAPI, LangChain, routers…) y carga los pesos del
+     embedder, sin hacer ningún forward (el pool de hilos de torch/OpenMP no
+     sobrevive a un fork; cada worker hace su forward de prueba en el lifespan),
+  2. `gc.freeze()`: todo lo creado hasta ahí pasa a la generación permanente,
+     así el GC de los hijos no recorre ni escribe esas páginas,
+  3. abre el socket de escucha y hace fork de N workers que lo comparten.
+
+Los tensores del modelo viven fuera de los objetos Python y no se escriben al
+servir, así que sus páginas siguen compartidas: cada worker sólo añade su
+memoria privada (activaciones, pools de BD, cachés). Pools de BD, Redis y el
+micro-batcher se abren en cada worker (lifespan), nunca en el padre.
+
+El padre vigila a los hijos: relanza los que mueren y reenvía SIGTERM/SIGINT
+para un apagado ordenado.
+
+Métricas: antes de importar la app el padre fija PROMETHEUS_MULTIPROC_DIR
+(vacío) para que `/metrics` agregue los valores de todos los workers, y
+marca como muerto a cada worker que termina.
+
+    python -m apps.agent_service.serve --workers 4 --port 8001
+
+`bench_worker_rss` mide la memoria por worker de este modo frente a
+`uvicorn --workers`.
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import os
+import signal
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import uvicorn
+
+
+def _prepare_metrics_dir() -> None:
+    """Directorio multiproceso de prometheus_client: antes de importarlo."""
+    path = Path(
+        os.environ.get("PROMETHEUS_MULTIPROC_DIR") or tempfile.mkdtemp(prefix="scout-metrics-")
+    )
+    path.mkdir(parents=True, exist_ok=True)
+    for stale in path.glob("*.db"):             # restos de una ejecución anterior
+        stale.unlink()
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = str(path)
+
+
+def preload():
+    """Importa la app y carga los modelos en el padre; congela el heap."""
+    gc.disable()                        # sin colecciones a medias durante los imports
+    from apps.agent_service.embeddings import embedding_service
+    from apps.agent_service.main import app
+
+    embedding_service.model             # sólo pesos: el forward lo hace cada worker
+    gc.collect()
+    gc.freeze()
+    return app
+
+
+def _run_worker(config: uvicorn.Config, sock, threads: int) -> None:
+    # hijo: GC normal para lo que cree a partir de ahora (lo congelado no se toca)
+    gc.enable()
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    # por si algo abrió conexiones en el padre: no compartir sockets de BD
+    from apps.agent_service.db import async_engine, engine
+    engine.dispose(close=False)
+    async_engine.sync_engine.dispose(close=False)
+
+    if threads:
+        import torch
+        torch.set_num_threads(threads)  # N workers × todos los núcleos = sobresuscripción
+
+    try:
+        uvicorn.Server(config).run(sockets=[sock])
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(0)                     # sin atexit del padre
+
+
+def serve(
+    host: str = "0.0.0.0",
+    port: int = 8001,
+    workers: int = 2,
+    threads: int = 0,
+    log_level: str = "info",
+) -> None:
+    _prepare_metrics_dir()
+    app = preload()
+    from prometheus_client import multiprocess
+
+    config = uvicorn.Config(
+        app, host=host, port=port, lifespan="on", proxy_headers=True, log_level=log_level
+    )
+    sock = config.bind_socket()
+    threads = threads or max(1, (os.cpu_count() or 1) // workers)
+
+    children: dict[int, int] = {}       # pid → nº de worker
+    stopping = False
+
+    def spawn(slot: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            _run_worker(config, sock, threads)
+        children[pid] = slot
+
+    def stop(signum, _frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    for slot in range(workers):
+        spawn(slot)
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    print(f"🚀  {workers} workers (pid {sorted(children)}), {threads} hilos torch c/u")
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        slot = children.pop(pid, None)
+        multiprocess.mark_process_dead(pid)     # fuera sus gauges `livesum`
+        if slot is None or stopping:
+            continue
+        print(f"⚠️  worker {slot} (pid {pid}) terminó con estado {status}; relanzando")
+        time.sleep(1)
+        spawn(slot)
+    sock.close()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="API con modelos precargados y workers por fork")
+    ap.add_argument("--host", default=os.getenv("API_HOST_BIND", "0.0.0.0"))
+    ap.add_argument("--port", type=int, default=int(os.getenv("API_PORT", "8001")))
+    ap.add_argument("--workers", type=int, default=int(os.getenv("API_WORKERS", "2")))
+    ap.add_argument(
+        "--threads", type=int, default=int(os.getenv("API_TORCH_THREADS", "0")),
+        help="hilos de torch por worker (0 = núcleos / workers)",
+    )
+    ap.add_argument("--log-level", default="info")
+    args = ap.parse_args()
+    serve(args.host, args.port, args.workers, args.threads, args.log_level)
+
+
+if __name__ == "__main__":
+    main()
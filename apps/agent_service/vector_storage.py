@@ -0,0 +1,202 @@
+# apps/agent_service/vector_storage.py
+"""
+Índices vectoriales compactos en pgvector y búsqueda en dos fases.
+
+Formatos (NEWS_VECTOR_STORAGE / PLAYER_VECTOR_STORAGE):
+
+  • full     → índice sobre el `vector` float32 (4 B/dim),
+  • halfvec  → índice sobre `col::halfvec(d)`  (float16, 2 B/dim → ½),
+  • binary   → índice sobre `binary_quantize(col)::bit(d)` (1 bit/dim → 1/32),
+               distancia Hamming. Sólo tiene sentido con dimensiones altas
+               (noticias, 768); con los 43 de jugadores no discrimina.
+
+Son índices de expresión: la tabla conserva el vector completo y el índice
+(lo que tiene que caber en RAM) es el que encoge. Con halfvec/binary la
+búsqueda es:
+
+  1. fase gruesa: top `k × VECTOR_RERANK_FACTOR` por la expresión compacta,
+     servido por su índice HNSW / ivfflat,
+  2. reordenación exacta `<=>` con el vector completo sólo de esos candidatos.
+
+Las expresiones de índice y de consulta salen de aquí para que coincidan
+textualmente (si no, el planificador no usa el índice). halfvec y
+binary_quantize requieren pgvector ≥ 0.7.
+
+Un índice HNSW devuelve como mucho `hnsw.ef_search` filas (ivfflat, lo que
+haya en las `ivfflat.probes` listas visitadas) y aplica los filtros WHERE
+*después* de recorrerlas. `prepare_scan` (SET LOCAL, sólo esa transacción)
+ajusta el escaneo a los candidatos de la fase gruesa (`k × VECTOR_RERANK_FACTOR`
+con formato compacto):
+
+  • HNSW: ef_search ≥ nº de candidatos,
+  • ivfflat: probes es un nº de *listas*, no de filas: IVF_PROBES, subido sólo
+    lo justo para que probes × filas por lista cubra los candidatos
+    (`ivfflat_probes`, con `lists` y filas leídas del catálogo),
+
+y, con filtros, activa el escaneo iterativo (pgvector ≥ 0.8; en ivfflat
+acotado por `ivfflat.max_probes`) o, si no existe, fuerza un escaneo exacto.
+"""
+from __future__ import annotations
+
+import math
+import os
+import time
+from typing import Optional, Tuple
+
+import sqlalchemy as sa
+from pgvector.sqlalchemy import BIT, HALFVEC, Vector
+
+VECTOR_STORAGES = ("full", "halfvec", "binary")
+NEWS_VECTOR_STORAGE = os.getenv("NEWS_VECTOR_STORAGE", "full")
+PLAYER_VECTOR_STORAGE = os.getenv("PLAYER_VECTOR_STORAGE", "full")
+VECTOR_RERANK_FACTOR = int(os.getenv("VECTOR_RERANK_FACTOR", "4"))
+MIN_PGVECTOR_VERSION = (0, 7, 0)          # halfvec, bit ops, binary_quantize
+ITERATIVE_SCAN_VERSION = (0, 8, 0)        # hnsw/ivfflat.iterative_scan
+
+# nº de listas ivfflat que se visitan por búsqueda (recall ↔ latencia)
+IVF_PROBES = int(os.getenv("IVF_PROBES", "10"))
+# tamaño de la lista de candidatos HNSW (mínimo; ver `prepare_scan`)
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "40"))
+HNSW_EF_SEARCH_MAX = 1000                 # tope que admite pgvector
+IVF_DEFAULT_LISTS = 100                   # `lists` de pgvector si el índice no lo fija
+IVF_MAX_PROBES_FACTOR = 4                 # escaneo iterativo: hasta 4× las listas base
+IVF_STATS_TTL = 300.0                     # s; `lists` cambia al reindexar en la ingesta
+
+_server_version: Optional[tuple] = None   # versión de pgvector (se consulta una vez)
+_ivf_stats: dict = {}                     # índice → (instante, lists, filas de la tabla)
+
+if NEWS_VECTOR_STORAGE not in VECTOR_STORAGES:
+    raise ValueError(f"NEWS_VECTOR_STORAGE must be one of {VECTOR_STORAGES}")
+if PLAYER_VECTOR_STORAGE not in ("full", "halfvec"):
+    raise ValueError("PLAYER_VECTOR_STORAGE must be 'full' or 'halfvec'")
+
+
+def index_expression(column: str, dim: int, storage: str) -> Tuple[str, str]:
+    """(expresión SQL, operator class) del índice para `storage`."""
+    if storage == "halfvec":
+        return f"(({column})::halfvec({dim}))", "halfvec_cosine_ops"
+    if storage == "binary":
+        return f"((binary_quantize({column}))::bit({dim}))", "bit_hamming_ops"
+    return column, "vector_cosine_ops"
+
+
+def coarse_distance(column, query: sa.ColumnElement, dim: int, storage: str):
+    """
+    Distancia que sirve el índice de `storage`. `query` es el vector de
+    consulta ya como `vector(dim)`; se cuantiza en el servidor.
+    """
+    if storage == "halfvec":
+        return sa.cast(column, HALFVEC(dim)).cosine_distance(sa.cast(query, HALFVEC(dim)))
+    if storage == "binary":
+        quantized = sa.cast(sa.func.binary_quantize(column), BIT(dim))
+        return quantized.hamming_distance(sa.cast(sa.func.binary_quantize(query), BIT(dim)))
+    return column.cosine_distance(query)
+
+
+def query_vector(values, dim: int) -> sa.ColumnElement:
+    """Vector de consulta como parámetro `vector(dim)` (codec pgvector de asyncpg)."""
+    return sa.cast(sa.literal(list(values)), Vector(dim))
+
+
+async def pgvector_server_version(db) -> tuple:
+    global _server_version
+    if _server_version is None:
+        v = (await db.execute(sa.text(
+            "SELECT extversion FROM pg_extension WHERE extname = 'vector'"
+        ))).scalar()
+        _server_version = tuple(int(x) for x in v.split(".")) if v else ()
+    return _server_version
+
+
+def scan_candidates(k: int, storage: str) -> int:
+    """Filas que tiene que devolver el índice para `nearest(..., k)`."""
+    return k if storage == "full" else k * VECTOR_RERANK_FACTOR
+
+
+async def _ivfflat_stats(db, index_name: str) -> Tuple[int, float]:
+    """(lists, filas estimadas de la tabla) del índice ivfflat `index_name`."""
+    hit = _ivf_stats.get(index_name)
+    if hit is not None and time.monotonic() - hit[0] < IVF_STATS_TTL:
+        return hit[1], hit[2]
+    row = (await db.execute(sa.text("""
+        SELECT (SELECT option_value::int FROM pg_options_to_table(i.reloptions)
+                 WHERE option_name = 'lists') AS lists,
+               t.reltuples AS n_rows
+          FROM pg_class i
+          JOIN pg_index x ON x.indexrelid = i.oid
+          JOIN pg_class t ON t.oid = x.indrelid
+         WHERE i.relname = :name
+    """), {"name": index_name})).first()
+    lists = (row.lists if row is not None else None) or IVF_DEFAULT_LISTS
+    n_rows = max(float(row.n_rows), 0.0) if row is not None else 0.0   # -1 = sin ANALYZE
+    _ivf_stats[index_name] = (time.monotonic(), lists, n_rows)
+    return lists, n_rows
+
+
+def ivfflat_probes(candidates: int, lists: int, n_rows: float) -> int:
+    """Listas a visitar: IVF_PROBES, o las justas para reunir `candidates` filas."""
+    per_list = n_rows / lists
+    needed = math.ceil(candidates / per_list) if per_list >= 1 else IVF_PROBES
+    return max(1, min(lists, max(IVF_PROBES, needed)))
+
+
+async def prepare_scan(
+    db, k: int, storage: str, filtered: bool, ivfflat_index: Optional[str] = None
+) -> None:
+    """
+    SET LOCAL para que el índice (HNSW, o el ivfflat `ivfflat_index`) entregue
+    los candidatos de `nearest(..., k)` aunque haya filtros. Ejecutar en la
+    misma transacción que la búsqueda.
+    """
+    candidates = scan_candidates(k, storage)
+    index = "ivfflat" if ivfflat_index else "hnsw"
+    if ivfflat_index:
+        lists, n_rows = await _ivfflat_stats(db, ivfflat_index)
+        probes = ivfflat_probes(candidates, lists, n_rows)
+        stmts = [f"SET LOCAL ivfflat.probes = {probes}"]
+    else:
+        ef_search = min(max(candidates, HNSW_EF_SEARCH), HNSW_EF_SEARCH_MAX)
+        stmts = [f"SET LOCAL hnsw.ef_search = {ef_search}"]
+    if filtered:
+        if await pgvector_server_version(db) >= ITERATIVE_SCAN_VERSION:
+            # ivfflat sólo admite relaxed_order: `nearest` reordena fuera
+            order = "strict_order" if index == "hnsw" else "relaxed_order"
+            stmts.append(f"SET LOCAL {index}.iterative_scan = {order}")
+            if ivfflat_index:
+                max_probes = min(lists, IVF_MAX_PROBES_FACTOR * probes)
+                stmts.append(f"SET LOCAL ivfflat.max_probes = {max_probes}")
+        else:
+            stmts.append("SET LOCAL enable_indexscan = off")   # exacto, sin tope
+    for stmt in stmts:
+        await db.execute(sa.text(stmt))
+
+
+def nearest(cols: list, column, values, dim: int, storage: str, where: list, k: int):
+    """
+    SELECT de `cols` + `dist` (coseno exacto) de los `k` más cercanos a
+    `values`. Con `storage` compacto: candidatos por el índice cuantizado y
+    reordenación exacta sobre el vector completo.
+    """
+    query = query_vector(values, dim)
+    if storage == "full":
+        # subconsulta + ORDER BY exterior: orden exacto también con iterative_scan relaxed
+        dist = column.cosine_distance(query)
+        inner = (
+            sa.select(*cols, dist.label("dist"))
+            .where(*where)
+            .order_by(dist)
+            .limit(k)
+            .subquery("nn")
+        )
+        return sa.select(*[inner.c[c.key] for c in cols], inner.c.dist).order_by(inner.c.dist)
+
+    coarse = (
+        sa.select(*cols, column.label("_vec"))
+        .where(*where)
+        .order_by(coarse_distance(column, query, dim, storage))
+        .limit(k * VECTOR_RERANK_FACTOR)
+        .subquery("coarse")
+    )
+    dist = coarse.c._vec.cosine_distance(query)
+    outer = [coarse.c[c.key] for c in cols]
+    return sa.select(*outer, dist.label("dist")).order_by(dist).limit(k)
@@ -0,0 +1,91 @@
+# apps/agent_service/versions.py
+"""
+Lectura (con TTL) de los sellos de `data_versions` que escribe la ingesta.
+
+Cada dominio ("players", "news") tiene un contador que la ingesta incrementa
+al terminar; la API lo usa para saber cuándo recargar índices en memoria o
+invalidar cachés sin consultar la BD en cada petición.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, NamedTuple, Optional
+
+from sqlalchemy import select
+from sqlalchemy.exc import DBAPIError
+
+from apps.agent_service.db import AsyncSessionLocal, SessionLocal
+from apps.ingestion.seed_and_ingest import data_versions as versions_table
+
+VERSION_TTL = float(os.getenv("DATA_VERSION_TTL", "5"))   # segundos
+
+
+class DataVersion(NamedTuple):
+    version: int
+    updated_at: Optional[datetime]
+
+
+_UNKNOWN = DataVersion(0, None)
+
+
+class DataVersions:
+    """Caché local de sellos: como mucho una consulta por dominio cada `ttl` s."""
+
+    def __init__(self, ttl: float = VERSION_TTL):
+        self.ttl = ttl
+        self._cache: Dict[str, tuple[DataVersion, float]] = {}
+        self._lock = threading.Lock()
+
+    def _fresh(self, name: str) -> Optional[DataVersion]:
+        hit = self._cache.get(name)
+        if hit and time.monotonic() - hit[1] < self.ttl:
+            return hit[0]
+        return None
+
+    def _store(self, name: str, row) -> DataVersion:
+        value = DataVersion(row.version, row.updated_at) if row else _UNKNOWN
+        with self._lock:
+            self._cache[name] = (value, time.monotonic())
+        return value
+
+    @staticmethod
+    def _stmt(name: str):
+        return select(versions_table.c.version, versions_table.c.updated_at).where(
+            versions_table.c.name == name
+        )
+
+    def get(self, name: str) -> DataVersion:
+        cached = self._fresh(name)
+        if cached is not None:
+            return cached
+        try:
+            with SessionLocal() as db:
+                row = db.execute(self._stmt(name)).first()
+        except DBAPIError:                  # tabla aún no creada (BD vacía)
+            row = None
+        return self._store(name, row)
+
+    async def aget(self, name: str) -> DataVersion:
+        cached = self._fresh(name)
+        if cached is not None:
+            return cached
+        try:
+            async with AsyncSessionLocal() as db:
+                row = (await db.execute(self._stmt(name))).first()
+        except DBAPIError:
+            row = None
+        return self._store(name, row)
+
+    def invalidate(self, name: Optional[str] = None) -> None:
+        with self._lock:
+            if name is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(name, None)
+
+
+# instancia única del proceso
+data_versions = DataVersions()
@@ -0,0 +1,54 @@
+"""
+Cliente HTTP del dashboard hacia la API FastAPI con caché condicional.
+
+Guarda en la caché de Django el cuerpo de cada GET junto con su ETag /
+Last-Modified y revalida en la siguiente petición: si los datos no han
+cambiado (no ha habido ingesta) la API responde 304 sin consultar la BD ni
+codificar JSON, y se reutiliza la copia local.
+"""
+import hashlib
+import json
+import os
+
+import requests
+from django.core.cache import cache
+
+API_HOST = os.getenv("API_HOST", "http://api:8001")
+CONDITIONAL_CACHE_TTL = int(os.getenv("API_CONDITIONAL_CACHE_TTL", str(24 * 3600)))
+
+# conexiones keep-alive reutilizadas entre peticiones
+_session = requests.Session()
+
+
+def _cache_key(url: str, params: dict | None) -> str:
+    raw = url + "?" + json.dumps(params or {}, sort_keys=True, default=str)
+    return "api-cond:" + hashlib.sha1(raw.encode()).hexdigest()
+
+
+def get_json(path: str, params: dict | None = None, timeout: int = 30):
+    """GET `{API_HOST}{path}` revalidando con If-None-Match / If-Modified-Since."""
+    url = f"{API_HOST}{path}"
+    key = _cache_key(url, params)
+    cached = cache.get(key)
+
+    headers = {}
+    if cached:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+    r = _session.get(url, params=params, headers=headers, timeout=timeout)
+    if r.status_code == 304 and cached:
+        return cached["data"]
+    r.raise_for_status()
+
+    data = r.json()
+    etag, last_modified = r.headers.get("ETag"), r.headers.get("Last-Modified")
+    if etag or last_modified:
+        cache.set(
+            key,
+            {"etag": etag, "last_modified": last_modified, "data": data},
+            CONDITIONAL_CACHE_TTL,
+        )
+    return data
@@ -5,6 +5,7 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.staticfiles import finders
 import os, random
 
+from . import api_client
 from .chats.models import ChatSession
 from .models import FootballNews     
 
@@ -63,14 +64,15 @@ def home(request):
 API_HOST = os.getenv("API_HOST", "http://api:8001")  # si tu FastAPI sigue viva
 
 def _fetch_stats(ids: list[int]) -> dict[int, dict]:
-    """Devuelve {id: stats_dict} usando /players/batch."""
-    r = requests.post(
-        f"{API_HOST}/players/batch",
-        json={"ids": ids},
-        timeout=30,
+    """Devuelve {id: stats_dict} usando /players/batch (GET revalidado → 304 si no cambió)."""
+    players = api_client.get_json(
+        "/players/batch",
+        params={
+            "ids": ",".join(str(i) for i in ids),
+            "include_vector": "false",        # la tabla/gráficos no usan el vector
+        },
     )
-    r.raise_for_status()
-    return {p["id"]: p for p in r.json()}
+    return {p["id"]: p for p in players}
 
 def _context(base_id: int, cand_id: int, cand_ids: list[int], metrics: list[str]):
     # ── 1) obtener stats una sola vez ─────────────────────
@@ -0,0 +1,170 @@
+"""
+Re-embedding (backfill) de `football_news` para Smart‑Scouting‑AI
+-----------------------------------------------------------------
+Recalcula `football_news.embedding` tras un cambio de modelo usando todos los
+núcleos de la máquina de ingesta:
+
+* lee las noticias por páginas desde un cursor de servidor (ordenadas por id),
+* codifica cada página con el *multi-process pool* de sentence-transformers,
+* escribe los vectores en bloque (`UPDATE … FROM (VALUES …)`),
+* es reanudable: cada página confirmada imprime el último id procesado.
+
+Run:
+```bash
+python -m apps.ingestion.backfill_embeddings --workers 8
+# reanudar tras un corte (o procesar sólo un tramo)
+python -m apps.ingestion.backfill_embeddings --start-id 120000 --end-id 180000
+```
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+
+import sqlalchemy as sa
+from psycopg2.extras import execute_values
+from sentence_transformers import SentenceTransformer
+
+from apps.ingestion.seed_and_ingest import (
+    EMB_DIM,
+    EMB_MODEL,
+    FootballNews,
+    FootballNewsText,
+    bump_data_version,
+    embedding_service,
+    get_engine,
+)
+
+
+def _page_stmt(start_id: int | None, end_id: int | None) -> sa.Select:
+    """Noticias a re-embeber con su texto (frío) o, en su defecto, el resumen."""
+    text_col = sa.func.coalesce(
+        FootballNewsText.article_text, FootballNews.summary, FootballNews.title
+    )
+    stmt = (
+        sa.select(FootballNews.id, FootballNews.published_at, text_col.label("text"))
+        .outerjoin(
+            FootballNewsText,
+            sa.and_(
+                FootballNewsText.news_id == FootballNews.id,
+                FootballNewsText.published_at == FootballNews.published_at,
+            ),
+        )
+        .order_by(FootballNews.id)
+    )
+    if start_id is not None:
+        stmt = stmt.where(FootballNews.id >= start_id)
+    if end_id is not None:
+        stmt = stmt.where(FootballNews.id <= end_id)
+    return stmt
+
+
+def _write_page(engine: sa.Engine, rows: list, vectors) -> None:
+    """UPDATE masivo de una página con `execute_values` (una sola sentencia)."""
+    values = [
+        (r.id, r.published_at, "[" + ",".join(f"{x:.7g}" for x in vec) + "]")
+        for r, vec in zip(rows, vectors)
+    ]
+    with engine.begin() as conn:
+        cur = conn.connection.cursor()
+        execute_values(
+            cur,
+            """
+            UPDATE football_news AS n
+               SET embedding = v.emb
+              FROM (VALUES %s) AS v(id, published_at, emb)
+             WHERE n.id = v.id AND n.published_at = v.published_at
+            """,
+            values,
+            template="(%s, %s::timestamptz, %s::vector)",
+            page_size=len(values),
+        )
+
+
+def backfill_news_embeddings(
+    engine: sa.Engine,
+    model: SentenceTransformer,
+    *,
+    start_id: int | None = None,
+    end_id: int | None = None,
+    page_size: int = 2048,
+    batch_size: int = 64,
+    workers: int | None = None,
+) -> int:
+    """Re-embebe el rango de ids pedido. Devuelve el nº de filas actualizadas."""
+    workers = workers or os.cpu_count() or 1
+    pool = model.start_multi_process_pool(target_devices=["cpu"] * workers)
+    print(f"🧵  Embedding pool started: {workers} workers", flush=True)
+
+    done, last_id = 0, None
+    t0 = time.perf_counter()
+    try:
+        with engine.connect() as conn:
+            result = conn.execution_options(
+                stream_results=True, yield_per=page_size
+            ).execute(_page_stmt(start_id, end_id))
+
+            for rows in result.partitions():
+                texts = [r.text or "" for r in rows]
+                vectors = model.encode_multi_process(
+                    texts, pool, batch_size=batch_size
+                )
+                _write_page(engine, rows, vectors)
+
+                done += len(rows)
+                last_id = rows[-1].id
+                rate = done / max(time.perf_counter() - t0, 1e-9)
+                print(
+                    f"✅  {done} rows re-embedded (last id={last_id}, {rate:.0f} rows/s)"
+                    f" – resume with --start-id {last_id + 1}",
+                    flush=True,
+                )
+    finally:
+        SentenceTransformer.stop_multi_process_pool(pool)
+
+    return done
+
+
+# ----------------------------- CLI --------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-embed football_news in parallel")
+    parser.add_argument("--model", default=EMB_MODEL, help="sentence-transformers model")
+    parser.add_argument("--start-id", type=int, help="First news id to process (inclusive)")
+    parser.add_argument("--end-id", type=int, help="Last news id to process (inclusive)")
+    parser.add_argument("--page-size", type=int, default=2048, help="Rows per server-side fetch / bulk write")
+    parser.add_argument("--batch-size", type=int, default=64, help="Encode batch size per worker")
+    parser.add_argument("--workers", type=int, help="Encoding processes (default: all cores)")
+    parser.add_argument("--echo-sql", action="store_true")
+    args = parser.parse_args()
+
+    model = (
+        embedding_service.model if args.model == EMB_MODEL
+        else SentenceTransformer(args.model)
+    )
+    if model.get_sentence_embedding_dimension() != EMB_DIM:
+        sys.exit(
+            f"Model dimension {model.get_sentence_embedding_dimension()} "
+            f"!= football_news.embedding vector({EMB_DIM})"
+        )
+
+    engine = get_engine(echo=args.echo_sql)
+    n = backfill_news_embeddings(
+        engine,
+        model,
+        start_id=args.start_id,
+        end_id=args.end_id,
+        page_size=args.page_size,
+        batch_size=args.batch_size,
+        workers=args.workers,
+    )
+    if n:
+        bump_data_version(engine, "news")
+    print(f"✅ Backfill done: {n} rows")
+
+
+if __name__ == "__main__":
+    main()
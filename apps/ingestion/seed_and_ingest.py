@@ -22,22 +22,20 @@ import os
 import re
 import sys
 from datetime import datetime, timezone
+from functools import lru_cache
 from pathlib import Path
 from typing import List, Tuple
 
+import numpy as np
 import pandas as pd
 import sqlalchemy as sa
 from newspaper import Article
-from sentence_transformers import SentenceTransformer
 from sqlalchemy import orm
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, TSVECTOR
 from sqlalchemy.orm import declarative_base
 from pgvector.sqlalchemy import Vector
-from transformers import pipeline, AutoTokenizer, AutoModelForSeq2SeqLM
 from bs4 import BeautifulSoup
 import requests
-import torch
-from transformers import logging as hf_logging
 import feedparser
 from tqdm.auto import tqdm
 from pgvector.sqlalchemy import Vector
@@ -45,25 +43,48 @@ from sklearn.preprocessing import StandardScaler
 import unicodedata, unidecode, re
 from sqlalchemy.dialects.postgresql import insert as pg_insert
 
-hf_logging.set_verbosity_error()
+DIM = 43  # Dimensión del vector de características (== PLAYER_DIM, ver FEATURE_COLS)
 
-DIM = 42  # Dimensión del vector de características (ajustar según el modelo)
-
-# fuera de las funciones, para que se cargue una vez
-_SUMMARIZER = pipeline(
-    task="summarization",
-    model="facebook/bart-large-cnn",   # o t5-small / pegasus
-    device=0 if torch.cuda.is_available() else -1,
+# búsqueda léxica de noticias (fuentes en español: AS, Marca…)
+NEWS_TS_CONFIG = "spanish"
+NEWS_TSV_EXPR = (
+    f"to_tsvector('{NEWS_TS_CONFIG}', coalesce(title, '') || ' ' || coalesce(summary, ''))"
 )
-# tokenizer para contar tokens (opcional, si quieres trocear artículos muy largos)
-_TOKENIZER = AutoTokenizer.from_pretrained("facebook/bart-large-cnn")
 
+SUMMARIZER_MODEL = "facebook/bart-large-cnn"   # o t5-small / pegasus
 MAX_TOKENS = 1024 
 
-EMB_MODEL = "sentence-transformers/all-mpnet-base-v2"  # 768 d
-embedder = SentenceTransformer(EMB_MODEL)
 
-EMB_DIM = 768
+# BART se carga al primer resumen (sólo en la ingesta de noticias): la API
+# importa este módulo por los modelos ORM y no debe cargar ~1.6 GB de pesos
+@lru_cache(maxsize=1)
+def _summarizer():
+    import torch
+    from transformers import logging as hf_logging, pipeline
+
+    hf_logging.set_verbosity_error()
+    return pipeline(
+        task="summarization",
+        model=SUMMARIZER_MODEL,
+        device=0 if torch.cuda.is_available() else -1,
+    )
+
+
+# tokenizer para contar tokens y trocear artículos muy largos
+@lru_cache(maxsize=1)
+def _tokenizer():
+    from transformers import AutoTokenizer
+
+    return AutoTokenizer.from_pretrained(SUMMARIZER_MODEL)
+
+# embedder compartido con la API (un único modelo por proceso)
+from apps.agent_service.embeddings import EMB_MODEL, EMB_DIM, embedding_service
+from apps.agent_service.vector_storage import (
+    MIN_PGVECTOR_VERSION,
+    NEWS_VECTOR_STORAGE,
+    PLAYER_VECTOR_STORAGE,
+    index_expression,
+)
 
 # ───  helper  ────────────────────────────────────────────────────────────
 _WS_RE = re.compile(r"\s+")
@@ -150,27 +171,143 @@ class Player(Base):
     # optional: pgvector column for aggregated numerical vector
     feature_vector = sa.Column(Vector(DIM))
 
+    # nombre normalizado (minúsculas, sin tildes) para la búsqueda por trigramas
+    search_name = sa.Column(sa.Text)
+
+    __table_args__ = (
+        sa.Index(
+            "players_search_name_trgm",
+            "search_name",
+            postgresql_using="gin",
+            postgresql_ops={"search_name": "gin_trgm_ops"},
+        ),
+    )
+
 
 class FootballNews(Base):
+    """
+    Tabla *caliente*: filas estrechas, particionadas por rango mensual de
+    `published_at` (ver `ensure_news_partitions`). El texto completo vive en
+    `FootballNewsText` y sólo se lee cuando una tool necesita el contenido.
+    """
     __tablename__ = "football_news"
+    __table_args__ = (
+        sa.PrimaryKeyConstraint("id", "published_at"),
+        # búsqueda híbrida (ver `ensure_news_search_indexes`)
+        sa.Index("football_news_search_tsv_idx", "search_tsv", postgresql_using="gin"),
+        # el HNSW de `embedding` depende de NEWS_VECTOR_STORAGE: ver `ensure_news_vector_index`
+        sa.Index("football_news_source_recent_idx", "source_id", sa.text("published_at DESC")),
+        {"postgresql_partition_by": "RANGE (published_at)"},
+    )
 
-    id           = sa.Column(sa.Integer, primary_key=True)
-    url          = sa.Column(sa.Text, unique=True, nullable=False)
+    id           = sa.Column(sa.Integer, autoincrement=True, nullable=False)
+    url          = sa.Column(sa.Text, nullable=False, index=True)
     title        = sa.Column(sa.Text, nullable=False)
-    published_at = sa.Column(sa.DateTime(timezone=True), index=True)
-    article_text = sa.Column(sa.Text)
+    published_at = sa.Column(sa.DateTime(timezone=True), nullable=False, index=True)
     summary      = sa.Column(sa.Text)
     embedding    = sa.Column(Vector(EMB_DIM))           # pgvector
     source_id    = sa.Column(sa.String(50))
     article_meta = sa.Column(sa.JSON, nullable=True)  # <— en vez de `metadata`
+    # texto indexado para la búsqueda léxica (lo calcula PostgreSQL)
+    search_tsv   = sa.Column(TSVECTOR, sa.Computed(NEWS_TSV_EXPR, persisted=True))
+
+
+class FootballNewsText(Base):
+    """Almacenamiento *frío* del texto completo de cada noticia."""
+    __tablename__ = "football_news_text"
+    __table_args__ = (
+        sa.ForeignKeyConstraint(
+            ["news_id", "published_at"],
+            ["football_news.id", "football_news.published_at"],
+            ondelete="CASCADE",
+        ),
+    )
+
+    news_id      = sa.Column(sa.Integer, primary_key=True)
+    published_at = sa.Column(sa.DateTime(timezone=True), nullable=False, index=True)
+    article_text = sa.Column(sa.Text)
 
 
 player_news = sa.Table(
     "player_news",
     Base.metadata,
     sa.Column("player_id", sa.Integer, sa.ForeignKey("players.id", ondelete="CASCADE")),
-    sa.Column("news_id",   sa.Integer, sa.ForeignKey("football_news.id", ondelete="CASCADE")),
+    sa.Column("news_id",   sa.Integer, nullable=False),
+    sa.Column("published_at", sa.DateTime(timezone=True), nullable=False),
     sa.PrimaryKeyConstraint("player_id", "news_id"),
+    sa.ForeignKeyConstraint(
+        ["news_id", "published_at"],
+        ["football_news.id", "football_news.published_at"],
+        ondelete="CASCADE",
+    ),
+    # sirve `WHERE player_id = ? ORDER BY published_at DESC, news_id DESC` (keyset)
+    sa.Index(
+        "player_news_player_recent_idx",
+        "player_id", sa.text("published_at DESC"), sa.text("news_id DESC"),
+    ),
+)
+
+# Top-N vecinos precalculados de cada jugador dentro de su posición
+# (excluido su club, como la búsqueda por defecto). Ver `refresh_player_neighbors`.
+player_neighbors = sa.Table(
+    "player_neighbors",
+    Base.metadata,
+    sa.Column("player_id", sa.Integer, sa.ForeignKey("players.id", ondelete="CASCADE")),
+    sa.Column("rank", sa.SmallInteger, nullable=False),
+    sa.Column("neighbor_id", sa.Integer, sa.ForeignKey("players.id", ondelete="CASCADE"),
+              nullable=False),
+    sa.Column("similarity", sa.Float, nullable=False),
+    sa.PrimaryKeyConstraint("player_id", "rank"),
+)
+
+# Cuantiles p0…p100 de cada métrica de FEATURE_COLS por posición / liga
+# (ver `refresh_player_percentiles`); scope="all" → toda la tabla (group="").
+player_metric_quantiles = sa.Table(
+    "player_metric_quantiles",
+    Base.metadata,
+    sa.Column("scope", sa.String(16)),
+    sa.Column("group", sa.String(64)),
+    sa.Column("metric", sa.String(64)),
+    sa.Column("n", sa.Integer, nullable=False),
+    sa.Column("quantiles", ARRAY(sa.Float), nullable=False),
+    sa.PrimaryKeyConstraint("scope", "group", "metric"),
+)
+
+# Noticias retiradas de la tabla caliente (ver `archive_news`)
+football_news_archive = sa.Table(
+    "football_news_archive",
+    Base.metadata,
+    sa.Column("id", sa.Integer, primary_key=True),
+    sa.Column("url", sa.Text, nullable=False),
+    sa.Column("title", sa.Text, nullable=False),
+    sa.Column("published_at", sa.DateTime(timezone=True), index=True),
+    sa.Column("summary", sa.Text),
+    sa.Column("article_text", sa.Text),
+    sa.Column("embedding", Vector(EMB_DIM)),
+    sa.Column("source_id", sa.String(50)),
+    sa.Column("article_meta", sa.JSON, nullable=True),
+    sa.Column("archived_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+)
+
+# Deduplicación de noticias por URL. La PK de `football_news` tiene que incluir
+# `published_at` (clave de partición), así que PostgreSQL no puede imponer un
+# UNIQUE(url) sobre ella; esta tabla sí. No tiene FK: las URLs de noticias ya
+# archivadas siguen aquí y no se vuelven a ingerir.
+news_urls = sa.Table(
+    "news_urls",
+    Base.metadata,
+    sa.Column("url", sa.Text, primary_key=True),
+    sa.Column("first_seen", sa.DateTime(timezone=True), server_default=sa.func.now()),
+)
+
+# Sello de versión por dominio ("players", "news"): la API lo consulta para
+# recargar índices en memoria e invalidar cachés tras cada ingesta.
+data_versions = sa.Table(
+    "data_versions",
+    Base.metadata,
+    sa.Column("name", sa.String(32), primary_key=True),
+    sa.Column("version", sa.BigInteger, nullable=False),
+    sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False),
 )
 
 # ---------------------------------------------------------------------------
@@ -185,7 +322,340 @@ def create_tables(engine):
     # Asegurarse de que existe la extensión vector
     with engine.begin() as conn:
         conn.exec_driver_sql("CREATE EXTENSION IF NOT EXISTS vector;")
+        conn.exec_driver_sql("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
+    if _news_table_is_legacy(engine):
+        migrate_news_to_partitions(engine)
+    with engine.connect() as conn:
+        new_urls_table = conn.exec_driver_sql(
+            "SELECT to_regclass('public.news_urls') IS NULL"
+        ).scalar()
     Base.metadata.create_all(engine)
+    if new_urls_table:
+        backfill_news_urls(engine)
+    ensure_player_search_name(engine)
+    ensure_news_search_indexes(engine)
+    ensure_news_vector_index(engine)
+    with engine.begin() as conn:
+        now = datetime.now(tz=timezone.utc)
+        ensure_news_partitions(conn, now, _add_months(now, NEWS_PARTITIONS_AHEAD))
+
+def bump_data_version(engine: sa.Engine, name: str) -> None:
+    """Incrementa el sello `name` de `data_versions` (lo crea si no existe)."""
+    now = datetime.now(tz=timezone.utc)
+    stmt = pg_insert(data_versions).values(name=name, version=1, updated_at=now)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[data_versions.c.name],
+        set_={"version": data_versions.c.version + 1, "updated_at": now},
+    )
+    with engine.begin() as conn:
+        conn.execute(stmt)
+
+def ensure_news_search_indexes(engine: sa.Engine) -> None:
+    """
+    Columnas/índices de la búsqueda híbrida en tablas ya existentes (en una BD
+    nueva los crea `create_all`). Sobre la tabla particionada se propagan a
+    todas las particiones, actuales y futuras.
+    """
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"""
+            ALTER TABLE football_news ADD COLUMN IF NOT EXISTS search_tsv tsvector
+                GENERATED ALWAYS AS ({NEWS_TSV_EXPR}) STORED;
+        """)
+        conn.exec_driver_sql("""
+            CREATE INDEX IF NOT EXISTS football_news_search_tsv_idx
+                ON football_news USING gin (search_tsv);
+            CREATE INDEX IF NOT EXISTS football_news_source_recent_idx
+                ON football_news (source_id, published_at DESC);
+        """)
+
+
+# índice HNSW de football_news.embedding por formato (ver vector_storage.py)
+NEWS_VEC_INDEXES = {
+    "full": "football_news_embedding_hnsw",
+    "halfvec": "football_news_embedding_halfvec_hnsw",
+    "binary": "football_news_embedding_binary_hnsw",
+}
+
+
+def pgvector_version(conn) -> tuple:
+    v = conn.exec_driver_sql(
+        "SELECT extversion FROM pg_extension WHERE extname = 'vector'"
+    ).scalar()
+    return tuple(int(x) for x in v.split(".")) if v else ()
+
+
+def require_vector_storage(conn, storage: str) -> None:
+    """halfvec / binary necesitan pgvector ≥ 0.7: actualiza la extensión o falla claro."""
+    if storage == "full" or pgvector_version(conn) >= MIN_PGVECTOR_VERSION:
+        return
+    conn.exec_driver_sql("ALTER EXTENSION vector UPDATE;")
+    found = pgvector_version(conn)
+    if found < MIN_PGVECTOR_VERSION:
+        raise RuntimeError(
+            f"vector storage '{storage}' needs pgvector >= "
+            f"{'.'.join(map(str, MIN_PGVECTOR_VERSION))} (found {'.'.join(map(str, found))})"
+        )
+
+
+def ensure_news_vector_index(engine: sa.Engine, storage: str = NEWS_VECTOR_STORAGE) -> None:
+    """
+    HNSW de `football_news.embedding` en el formato `storage` (full / halfvec /
+    binary) y fuera los de los otros formatos: sólo uno ocupa memoria.
+    """
+    expr, ops = index_expression("embedding", EMB_DIM, storage)
+    with engine.begin() as conn:
+        require_vector_storage(conn, storage)
+        conn.exec_driver_sql(f"""
+            CREATE INDEX IF NOT EXISTS {NEWS_VEC_INDEXES[storage]}
+                ON football_news USING hnsw ({expr} {ops});
+        """)
+        for other, name in NEWS_VEC_INDEXES.items():
+            if other != storage:
+                conn.exec_driver_sql(f"DROP INDEX IF EXISTS {name};")
+
+# --------------------------- News partitions -------------------------
+
+NEWS_PARTITIONS_AHEAD = 2          # meses futuros con partición ya creada
+NEWS_PARTITION_RE = re.compile(r"^football_news_p(\d{4})(\d{2})$")
+
+
+def _month_start(dt: datetime) -> datetime:
+    return datetime(dt.year, dt.month, 1, tzinfo=timezone.utc)
+
+
+def _add_months(dt: datetime, n: int) -> datetime:
+    y, m = divmod(dt.month - 1 + n, 12)
+    return datetime(dt.year + y, m + 1, 1, tzinfo=timezone.utc)
+
+
+def _move_out_of_default(conn, lo: datetime, hi: datetime) -> int:
+    """
+    Saca de `football_news_default` las filas de [lo, hi) (con su texto y sus
+    enlaces a jugadores) y las guarda en tablas temporales. Mientras la
+    DEFAULT tenga filas de un mes, PostgreSQL no deja crear su partición.
+    Devuelve nº de noticias movidas; `_restore_moved` las reinserta.
+    """
+    has_default = conn.exec_driver_sql(
+        "SELECT to_regclass('public.football_news_default') IS NOT NULL"
+    ).scalar()
+    if not has_default:
+        return 0
+
+    bounds = {"lo": lo, "hi": hi}
+    conn.execute(sa.text("""
+        CREATE TEMP TABLE _moved_news ON COMMIT DROP AS
+        SELECT id, url, title, published_at, summary, embedding, source_id, article_meta
+          FROM football_news_default
+         WHERE published_at >= :lo AND published_at < :hi
+    """), bounds)
+    moved = conn.exec_driver_sql("SELECT count(*) FROM _moved_news").scalar()
+    if not moved:
+        conn.exec_driver_sql("DROP TABLE _moved_news;")
+        return 0
+
+    conn.exec_driver_sql("""
+        CREATE TEMP TABLE _moved_text ON COMMIT DROP AS
+        SELECT t.* FROM football_news_text t
+          JOIN _moved_news m ON m.id = t.news_id AND m.published_at = t.published_at;
+        CREATE TEMP TABLE _moved_links ON COMMIT DROP AS
+        SELECT l.* FROM player_news l
+          JOIN _moved_news m ON m.id = l.news_id AND m.published_at = l.published_at;
+    """)
+    # ON DELETE CASCADE borra también el texto y los enlaces (ya copiados)
+    conn.execute(sa.text(
+        "DELETE FROM football_news_default WHERE published_at >= :lo AND published_at < :hi"
+    ), bounds)
+    return moved
+
+
+def _restore_moved(conn) -> None:
+    conn.exec_driver_sql("""
+        INSERT INTO football_news
+               (id, url, title, published_at, summary, embedding, source_id, article_meta)
+        SELECT * FROM _moved_news;
+        INSERT INTO football_news_text SELECT * FROM _moved_text;
+        INSERT INTO player_news SELECT * FROM _moved_links;
+        DROP TABLE _moved_news, _moved_text, _moved_links;
+    """)
+
+
+def ensure_news_partitions(conn, start: datetime, end: datetime) -> None:
+    """
+    Crea (idempotente) las particiones mensuales de `football_news` que
+    cubren [start, end] más una partición DEFAULT para fechas fuera de rango.
+    Si la DEFAULT ya tiene filas de un mes nuevo, se mueven a su partición.
+    """
+    month = _month_start(start)
+    while month <= end:
+        nxt = _add_months(month, 1)
+        exists = conn.exec_driver_sql(
+            f"SELECT to_regclass('public.football_news_p{month:%Y%m}') IS NOT NULL"
+        ).scalar()
+        if exists:
+            month = nxt
+            continue
+        moved = _move_out_of_default(conn, month, nxt)
+        conn.exec_driver_sql(f"""
+            CREATE TABLE IF NOT EXISTS football_news_p{month:%Y%m}
+              PARTITION OF football_news
+              FOR VALUES FROM ('{month:%Y-%m-%d} 00:00:00+00')
+                           TO ('{nxt:%Y-%m-%d} 00:00:00+00');
+        """)
+        if moved:
+            _restore_moved(conn)
+            print(f"📦  {moved} news moved from football_news_default → football_news_p{month:%Y%m}")
+        month = nxt
+    conn.exec_driver_sql("""
+        CREATE TABLE IF NOT EXISTS football_news_default
+          PARTITION OF football_news DEFAULT;
+    """)
+
+
+def backfill_news_urls(engine: sa.Engine) -> None:
+    """Rellena `news_urls` con las URLs ya presentes (tabla caliente y archivo)."""
+    with engine.begin() as conn:
+        n = conn.exec_driver_sql("""
+            INSERT INTO news_urls (url)
+            SELECT url FROM football_news
+             UNION
+            SELECT url FROM football_news_archive
+            ON CONFLICT (url) DO NOTHING;
+        """).rowcount
+    print(f"🔗  news_urls backfilled with {n} URLs")
+
+
+def _news_table_is_legacy(engine: sa.Engine) -> bool:
+    """True si `football_news` existe pero todavía no está particionada."""
+    with engine.connect() as conn:
+        relkind = conn.exec_driver_sql(
+            "SELECT relkind FROM pg_class "
+            "WHERE relname = 'football_news' AND relnamespace = 'public'::regnamespace"
+        ).scalar()
+    return relkind == "r"
+
+
+def migrate_news_to_partitions(engine: sa.Engine) -> None:
+    """
+    Convierte una `football_news` monolítica al esquema particionado:
+    copia los datos, recrea tablas (caliente, fría y `player_news`) y
+    restaura la secuencia de ids. Todo en una única transacción.
+    """
+    print("🧱  Migrating football_news → partitioned + cold article_text …", flush=True)
+    with engine.begin() as conn:
+        has_links = conn.exec_driver_sql(
+            "SELECT to_regclass('public.player_news') IS NOT NULL"
+        ).scalar()
+
+        conn.exec_driver_sql(
+            "UPDATE football_news SET published_at = now() WHERE published_at IS NULL;"
+        )
+        conn.exec_driver_sql("CREATE TABLE _news_legacy AS TABLE football_news;")
+        if has_links:
+            conn.exec_driver_sql("CREATE TABLE _links_legacy AS TABLE player_news;")
+            conn.exec_driver_sql("DROP TABLE player_news;")
+        conn.exec_driver_sql("DROP TABLE football_news CASCADE;")
+
+        Base.metadata.create_all(
+            conn,
+            tables=[
+                FootballNews.__table__,
+                FootballNewsText.__table__,
+                player_news,
+                football_news_archive,
+            ],
+        )
+
+        lo, hi = conn.exec_driver_sql(
+            "SELECT min(published_at), max(published_at) FROM _news_legacy"
+        ).one()
+        now = datetime.now(tz=timezone.utc)
+        ensure_news_partitions(
+            conn, lo or now, max(hi or now, _add_months(now, NEWS_PARTITIONS_AHEAD))
+        )
+
+        conn.exec_driver_sql("""
+            INSERT INTO football_news
+                   (id, url, title, published_at, summary, embedding, source_id, article_meta)
+            SELECT  id, url, title, published_at, summary, embedding, source_id, article_meta
+              FROM _news_legacy;
+        """)
+        conn.exec_driver_sql("""
+            INSERT INTO football_news_text (news_id, published_at, article_text)
+            SELECT id, published_at, article_text FROM _news_legacy;
+        """)
+        if has_links:
+            conn.exec_driver_sql("""
+                INSERT INTO player_news (player_id, news_id, published_at)
+                SELECT l.player_id, l.news_id, n.published_at
+                  FROM _links_legacy l
+                  JOIN _news_legacy n ON n.id = l.news_id;
+            """)
+            conn.exec_driver_sql("DROP TABLE _links_legacy;")
+
+        conn.exec_driver_sql("""
+            SELECT setval(pg_get_serial_sequence('football_news', 'id'),
+                          COALESCE((SELECT max(id) FROM football_news), 1));
+        """)
+        conn.exec_driver_sql("DROP TABLE _news_legacy;")
+    print("✅  football_news migrated to monthly partitions")
+
+
+def archive_news(engine: sa.Engine, keep_months: int, archive: bool = True) -> int:
+    """
+    Retira de la tabla caliente las particiones mensuales más antiguas que
+    `keep_months`. Si `archive` es True las filas (con su texto completo) se
+    copian antes a `football_news_archive`. Devuelve nº de particiones retiradas.
+    """
+    cutoff = _add_months(_month_start(datetime.now(tz=timezone.utc)), -keep_months)
+
+    with engine.begin() as conn:
+        names = conn.exec_driver_sql("""
+            SELECT c.relname
+              FROM pg_inherits i
+              JOIN pg_class c ON c.oid = i.inhrelid
+             WHERE i.inhparent = 'football_news'::regclass
+        """).scalars().all()
+
+    expired = []
+    for name in names:
+        m = NEWS_PARTITION_RE.match(name)
+        if not m:
+            continue
+        month = datetime(int(m.group(1)), int(m.group(2)), 1, tzinfo=timezone.utc)
+        if _add_months(month, 1) <= cutoff:
+            expired.append((name, month, _add_months(month, 1)))
+
+    for name, lo, hi in sorted(expired, key=lambda x: x[1]):
+        with engine.begin() as conn:
+            bounds = {"lo": lo, "hi": hi}
+            if archive:
+                conn.execute(sa.text(f"""
+                    INSERT INTO football_news_archive
+                           (id, url, title, published_at, summary, article_text,
+                            embedding, source_id, article_meta)
+                    SELECT n.id, n.url, n.title, n.published_at, n.summary, t.article_text,
+                           n.embedding, n.source_id, n.article_meta
+                      FROM {name} n
+                      LEFT JOIN football_news_text t
+                        ON t.news_id = n.id AND t.published_at = n.published_at
+                    ON CONFLICT (id) DO NOTHING
+                """))
+            # las FK compuestas impiden DETACH mientras existan referencias
+            conn.execute(sa.text(
+                "DELETE FROM player_news WHERE published_at >= :lo AND published_at < :hi"
+            ), bounds)
+            conn.execute(sa.text(
+                "DELETE FROM football_news_text WHERE published_at >= :lo AND published_at < :hi"
+            ), bounds)
+            conn.exec_driver_sql(f"ALTER TABLE football_news DETACH PARTITION {name};")
+            conn.exec_driver_sql(f"DROP TABLE {name};")
+        print(f"🗄️  {name} {'archived' if archive else 'dropped'}")
+
+    if expired:
+        bump_data_version(engine, "news")
+    else:
+        print(f"🟢  No news partitions older than {cutoff:%Y-%m}.")
+    return len(expired)
 
 # --------------------------- CSV ingest -------------------------
 
@@ -315,6 +785,7 @@ def load_players(engine: sa.Engine, csv_path: Path,  if_exists: str = "append"):
     ]
 
     df["full_name"] = df["full_name"].apply(clean_name)
+    df["search_name"] = df["full_name"].apply(search_key)
 
     for col in int_cols:
         df[col] = df[col].apply(_to_int)
@@ -331,6 +802,8 @@ def load_players(engine: sa.Engine, csv_path: Path,  if_exists: str = "append"):
             """))
 
     df.to_sql("players", con=engine, if_exists="append", index=False, method="multi")
+    refresh_player_percentiles(engine)
+    bump_data_version(engine, "players")
     print(f"✅ Players upserted: {len(df)}")
 
 
@@ -396,14 +869,14 @@ def safe_summarize(text: str) -> str:
     """
     try:
         # tokens reales del chunk
-        n_tokens = len(_TOKENIZER(text).input_ids)
+        n_tokens = len(_tokenizer()(text).input_ids)
 
         # Queremos algo más corto que el original pero > min_length
         max_len = max(20, int(n_tokens * 0.8))    # 80 % del tamaño
         max_len = min(max_len, 128)               # nunca > 128
         min_len = max(10, int(max_len * 0.25))    # 25 % del max_len
 
-        return _SUMMARIZER(
+        return _summarizer()(
             text,
             max_length=max_len,
             min_length=min_len,
@@ -427,11 +900,12 @@ def parse_article(url: str) -> tuple[str, str] | None:
         return None
 
     # Split by tokens ≤1024 para BART
-    tokens = _TOKENIZER(text).input_ids
+    tokenizer = _tokenizer()
+    tokens = tokenizer(text).input_ids
     chunks = []
     while tokens:
-        chunk_ids, tokens = tokens[:1024], tokens[1024:]
-        chunks.append(_TOKENIZER.decode(chunk_ids, skip_special_tokens=True))
+        chunk_ids, tokens = tokens[:MAX_TOKENS], tokens[MAX_TOKENS:]
+        chunks.append(tokenizer.decode(chunk_ids, skip_special_tokens=True))
 
     # Resumen jerárquico
     summaries = [safe_summarize(c) for c in chunks]
@@ -447,11 +921,10 @@ def embed_texts(texts: list[str], verbose: bool = False) -> list[list[float]]:
     
     print(f"🔎 Embedding {len(valid_texts)} documentos…", flush=True)
     
-    return embedder.encode(
+    return embedding_service.encode(
         valid_texts,
         batch_size=32,
         show_progress_bar=verbose,
-        convert_to_numpy=True,
     ).tolist()
 
 
@@ -488,6 +961,13 @@ def ingest_news(engine: sa.Engine, verbose: bool = False):
     # Usa RESÚMENES (o texts) para la embedding; los dos tienen la misma len
     embeddings = embed_texts(texts, verbose=verbose)
 
+    with engine.begin() as conn:
+        ensure_news_partitions(
+            conn,
+            min(m["published_at"] for m in metas),
+            _add_months(datetime.now(tz=timezone.utc), NEWS_PARTITIONS_AHEAD),
+        )
+
     with orm.Session(engine) as session:
         inserted = 0
         for text, summary, emb, meta in tqdm(
@@ -498,32 +978,47 @@ def ingest_news(engine: sa.Engine, verbose: bool = False):
             disable=not verbose, 
             dynamic_ncols=True
         ):
-            if session.query(FootballNews).filter_by(url=meta["url"]).first():
+            # reserva atómica de la URL: con dos ingestas a la vez sólo una la inserta
+            claimed = session.execute(
+                pg_insert(news_urls)
+                .values(url=meta["url"])
+                .on_conflict_do_nothing(index_elements=[news_urls.c.url])
+                .returning(news_urls.c.url)
+            ).first()
+            if claimed is None:
                 continue  # duplicado
 
+            news = FootballNews(
+                url         = meta["url"],
+                title       = meta["title"],
+                published_at= meta["published_at"],
+                summary     = summary,
+                embedding   = list(map(float, emb)),
+                source_id   = meta["source"],
+                article_meta= {"source": meta["source"]},
+            )
+            session.add(news)
+            session.flush()            # → news.id para la tabla fría
             session.add(
-                FootballNews(
-                    url         = meta["url"],
-                    title       = meta["title"],
-                    published_at= meta["published_at"],
-                    article_text= text,
-                    summary     = summary,
-                    embedding   = list(map(float, emb)),
-                    source_id   = meta["source"],
-                    article_meta= {"source": meta["source"]},
+                FootballNewsText(
+                    news_id      = news.id,
+                    published_at = news.published_at,
+                    article_text = text,
                 )
             )
             inserted += 1
         session.commit()
 
+    if inserted:
+        bump_data_version(engine, "news")
     print(f"✅ News upserted: {inserted}")
 
 # ---------------------------------------------------------------------------
 #  ==  Embedding / Standard‑Scaler pipeline for players  ====================
 # ---------------------------------------------------------------------------
 
-PLAYER_DIM = 43                 # 42 stats + minutes_90s (🗒️ ajusta si cambias)
-IVF_LISTS  = 140                # number of lists for ivfflat
+PLAYER_DIM = DIM                # 42 stats + minutes_90s (🗒️ ajusta si cambias)
+PLAYER_VEC_INDEX = "players_feature_vec_idx"
 
 FEATURE_COLS = [
     "minutes", "minutes_90s",
@@ -547,19 +1042,58 @@ FEATURE_COLS = [
 assert len(FEATURE_COLS) == PLAYER_DIM, "Dim mismatch ‑ adjust FEATURE_COLS"
 
 def prepare_pgvector(engine: sa.Engine):
-    """Ensure pgvector extension + index exist (idempotent)."""
+    """Ensure pgvector extension + column exist (idempotent).
+
+    The ivfflat index is *not* created here: building it before the vectors
+    are written trains the lists on empty/stale data. See
+    `build_player_vector_index`, called after every bulk vector write.
+    """
     with engine.begin() as conn:
         conn.exec_driver_sql("CREATE EXTENSION IF NOT EXISTS vector;")
         conn.exec_driver_sql(f"""
            ALTER TABLE players
              ADD COLUMN IF NOT EXISTS feature_vector vector({PLAYER_DIM});
         """)
-        #  index
+
+
+def ivf_lists_for(n_rows: int) -> int:
+    """Nº de listas ivfflat según la guía de pgvector (rows/1000, √rows > 1M)."""
+    if n_rows <= 1_000_000:
+        return max(1, n_rows // 1000)
+    return int(n_rows ** 0.5)
+
+
+def drop_player_vector_index(engine: sa.Engine):
+    """Quita el índice antes de una escritura masiva (evita mantenerlo fila a fila)."""
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"DROP INDEX IF EXISTS {PLAYER_VEC_INDEX};")
+
+
+def build_player_vector_index(engine: sa.Engine) -> int:
+    """
+    (Re)crea el índice ivfflat de `players.feature_vector` sobre los datos
+    actuales, dimensionando `lists` a partir del nº de filas con vector.
+    Con PLAYER_VECTOR_STORAGE=halfvec el índice es sobre `feature_vector::halfvec`.
+    Devuelve el nº de listas usado.
+    """
+    expr, ops = index_expression("feature_vector", PLAYER_DIM, PLAYER_VECTOR_STORAGE)
+    with engine.begin() as conn:
+        require_vector_storage(conn, PLAYER_VECTOR_STORAGE)
+        n_rows = conn.exec_driver_sql(
+            "SELECT COUNT(*) FROM players WHERE feature_vector IS NOT NULL"
+        ).scalar() or 0
+        lists = ivf_lists_for(n_rows)
+
+        conn.exec_driver_sql(f"DROP INDEX IF EXISTS {PLAYER_VEC_INDEX};")
         conn.exec_driver_sql(f"""
-           CREATE INDEX IF NOT EXISTS players_feature_vec_idx
-             ON players USING ivfflat (feature_vector vector_cosine_ops)
-             WITH (lists = {IVF_LISTS});
+           CREATE INDEX {PLAYER_VEC_INDEX}
+             ON players USING ivfflat ({expr} {ops})
+             WITH (lists = {lists});
         """)
+        conn.exec_driver_sql("ANALYZE players;")
+
+    print(f"🗂️  {PLAYER_VEC_INDEX} rebuilt ({PLAYER_VECTOR_STORAGE}): {n_rows} rows, lists={lists}")
+    return lists
 
 def compute_and_store_player_vectors(engine: sa.Engine, refresh: bool=False):
     """Compute Standard‑Scaled vectors and persist to DB (pgvector)."""
@@ -589,6 +1123,7 @@ def compute_and_store_player_vectors(engine: sa.Engine, refresh: bool=False):
     df["feature_vector"] = [v.tolist() for v in vec_matrix]
 
     # -------  Bulk update ---------------------------------------------------
+    drop_player_vector_index(engine)
     with engine.begin() as conn:
         conn.execute(
             sa.text("""
@@ -602,6 +1137,111 @@ def compute_and_store_player_vectors(engine: sa.Engine, refresh: bool=False):
 
     print(f"✅  Player embeddings stored: {len(df)} rows")
 
+    # -------  Índice sobre los vectores ya escritos -------------------------
+    build_player_vector_index(engine)
+    refresh_player_neighbors(engine)
+    bump_data_version(engine, "players")
+
+
+NEIGHBORS_TOP_N = int(os.getenv("PLAYER_NEIGHBORS_TOP_N", "50"))
+
+
+def refresh_player_neighbors(engine: sa.Engine, top_n: int = NEIGHBORS_TOP_N) -> int:
+    """
+    Recalcula `player_neighbors`: para cada posición, similitud coseno de todos
+    contra todos (matriz normalizada · su traspuesta) y top-N por fila con
+    `argpartition`, excluyendo al propio jugador y a los de su club.
+    Se reescribe en una transacción → los lectores ven la tabla vieja o la nueva.
+    """
+    df = pd.read_sql(
+        "SELECT id, position, club, feature_vector FROM players "
+        "WHERE feature_vector IS NOT NULL",
+        engine,
+    )
+    rows = []
+    for _, grp in df.groupby(df["position"].fillna(""), sort=False):
+        ids = grp["id"].to_numpy()
+        clubs = grp["club"].to_numpy(dtype=object)
+        mat = np.vstack([np.asarray(_parse_vec(v), dtype=np.float32) for v in grp["feature_vector"]])
+        norms = np.linalg.norm(mat, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        mat /= norms
+
+        sims = mat @ mat.T
+        np.fill_diagonal(sims, -np.inf)
+        sims[(clubs[:, None] == clubs[None, :]) & (clubs[:, None] != None)] = -np.inf  # noqa: E711
+
+        n = min(top_n, len(ids) - 1)
+        if n <= 0:
+            continue
+        part = np.argpartition(-sims, n - 1, axis=1)[:, :n]
+        part_sims = np.take_along_axis(sims, part, axis=1)
+        order = np.take_along_axis(part, np.argsort(-part_sims, axis=1, kind="stable"), axis=1)
+        for i, pid in enumerate(ids):
+            for rank, j in enumerate(order[i], start=1):
+                if not np.isfinite(sims[i, j]):
+                    break
+                rows.append({
+                    "player_id": int(pid),
+                    "rank": rank,
+                    "neighbor_id": int(ids[j]),
+                    "similarity": float(sims[i, j]),
+                })
+
+    with engine.begin() as conn:
+        conn.execute(player_neighbors.delete())
+        if rows:
+            conn.execute(player_neighbors.insert(), rows)
+    print(f"🤝  player_neighbors refreshed: {len(rows)} rows (top {top_n} per player)")
+    return len(rows)
+
+
+PERCENTILE_SCOPES = ("position", "league")
+
+
+def refresh_player_percentiles(engine: sa.Engine) -> int:
+    """
+    Recalcula `player_metric_quantiles`: para cada posición, cada liga y la
+    tabla completa, los 101 cuantiles (p0…p100) de cada métrica de
+    FEATURE_COLS ignorando nulos. El percentil de un jugador es después una
+    búsqueda binaria sobre 101 valores, sin volver a escanear `players`.
+    """
+    df = pd.read_sql(
+        f"SELECT position, league, {', '.join(FEATURE_COLS)} FROM players", engine
+    )
+    qs = np.linspace(0.0, 1.0, 101)
+    groups = [("all", "", df)]
+    for scope in PERCENTILE_SCOPES:
+        groups += [(scope, key, grp) for key, grp in df.groupby(scope, sort=False) if key]
+
+    rows = []
+    for scope, key, grp in groups:
+        for col in FEATURE_COLS:
+            values = pd.to_numeric(grp[col], errors="coerce").dropna().to_numpy()
+            if values.size == 0:
+                continue
+            rows.append({
+                "scope": scope,
+                "group": str(key),
+                "metric": col,
+                "n": int(values.size),
+                "quantiles": np.quantile(values, qs).round(6).tolist(),
+            })
+
+    with engine.begin() as conn:
+        conn.execute(player_metric_quantiles.delete())
+        if rows:
+            conn.execute(player_metric_quantiles.insert(), rows)
+    print(f"📊  Percentile table refreshed: {len(rows)} (scope, group, metric) rows")
+    return len(rows)
+
+
+def _parse_vec(v):
+    """pgvector leído con pandas llega como texto '[0.1,0.2,…]' (sin codec registrado)."""
+    if isinstance(v, str):
+        return [float(x) for x in v.strip("[]").split(",")]
+    return v
+
 # ---------------------------------------------------------------------------
 #  ==  Player ⇄ News linker  ================================================
 # ---------------------------------------------------------------------------
@@ -615,21 +1255,53 @@ def _norm(text: str) -> str:
     ).lower()
     return _WS.sub(" ", text).strip()
 
+def search_key(name: str) -> str:
+    """Clave de búsqueda de jugadores: misma normalización que el linker."""
+    return _norm(name)
+
+
+def ensure_player_search_name(engine: sa.Engine) -> None:
+    """Añade/rellena `players.search_name` y su índice GIN de trigramas (tablas antiguas)."""
+    with engine.begin() as conn:
+        conn.exec_driver_sql("ALTER TABLE players ADD COLUMN IF NOT EXISTS search_name text;")
+        rows = conn.execute(
+            sa.select(Player.id, Player.full_name).where(Player.search_name.is_(None))
+        ).all()
+        if rows:
+            conn.execute(
+                sa.update(Player.__table__)
+                .where(Player.__table__.c.id == sa.bindparam("pid"))
+                .values(search_name=sa.bindparam("key")),
+                [{"pid": r.id, "key": search_key(r.full_name)} for r in rows],
+            )
+            print(f"🔤  search_name filled: {len(rows)} players")
+        conn.exec_driver_sql("""
+            CREATE INDEX IF NOT EXISTS players_search_name_trgm
+                ON players USING gin (search_name gin_trgm_ops);
+        """)
+
+
 def ensure_link_index(engine: sa.Engine):
     with engine.begin() as conn:
         conn.exec_driver_sql(
             """
             CREATE TABLE IF NOT EXISTS player_news (
-              player_id  INTEGER NOT NULL REFERENCES players(id)  ON DELETE CASCADE,
-              news_id    INTEGER NOT NULL REFERENCES football_news(id) ON DELETE CASCADE,
-              PRIMARY KEY (player_id, news_id)
+              player_id     INTEGER NOT NULL REFERENCES players(id)  ON DELETE CASCADE,
+              news_id       INTEGER NOT NULL,
+              published_at  TIMESTAMPTZ NOT NULL,
+              PRIMARY KEY (player_id, news_id),
+              FOREIGN KEY (news_id, published_at)
+                REFERENCES football_news(id, published_at) ON DELETE CASCADE
             );
             """
         )
+        # el índice compuesto sustituye al antiguo (player_id) y devuelve las
+        # filas ya en el orden de la paginación por (published_at, news_id)
         conn.exec_driver_sql(
             """
-            CREATE INDEX IF NOT EXISTS player_news_player_idx
-              ON player_news(player_id);
+            CREATE INDEX IF NOT EXISTS player_news_player_recent_idx
+              ON player_news(player_id, published_at DESC, news_id DESC);
+            DROP INDEX IF EXISTS player_news_player_idx;
             """
         )
 
@@ -657,10 +1329,14 @@ def link_player_news(engine: sa.Engine, only_new: bool = True) -> None:
         name_re = re.compile(pattern, re.I)
 
         # 2️⃣ Rows to scan
-        q = sess.query(FootballNews.id, FootballNews.article_text)
+        q = sess.query(
+            FootballNewsText.news_id,
+            FootballNewsText.published_at,
+            FootballNewsText.article_text,
+        )
         if only_new:
             q = q.filter(
-                ~FootballNews.id.in_(
+                ~FootballNewsText.news_id.in_(
                     sess.query(player_news.c.news_id).distinct()
                 )
             )
@@ -671,7 +1347,7 @@ def link_player_news(engine: sa.Engine, only_new: bool = True) -> None:
             return
 
         inserted = 0
-        for news_id, article in tqdm(rows, desc="Linking news↔players", unit="article"):
+        for news_id, published_at, article in tqdm(rows, desc="Linking news↔players", unit="article"):
             matches = { _norm(m.group(0)) for m in name_re.finditer(article or "") }
 
             for n in matches:
@@ -679,12 +1355,15 @@ def link_player_news(engine: sa.Engine, only_new: bool = True) -> None:
                 if not pid:
                     continue
 
-                stmt = pg_insert(player_news).values(player_id=pid, news_id=news_id)
+                stmt = pg_insert(player_news).values(
+                    player_id=pid, news_id=news_id, published_at=published_at
+                )
                 stmt = stmt.on_conflict_do_nothing()
-                sess.execute(stmt)
-                inserted += 1
+                inserted += sess.execute(stmt).rowcount     # 0 si el enlace ya existía
 
         sess.commit()
+        if inserted:
+            bump_data_version(engine, "news")
         print(f"🔗  player_news linked: {inserted}")
 
 
@@ -703,6 +1382,23 @@ def main():
         action="store_true",
         help="Re‑compute player embeddings even if they exist"
     )
+    parser.add_argument(
+        "--archive-news-months",
+        type=int,
+        metavar="N",
+        help="Retire news partitions older than N months into football_news_archive"
+    )
+    parser.add_argument(
+        "--no-archive",
+        action="store_true",
+        help="With --archive-news-months: drop old partitions without archiving"
+    )
+    parser.add_argument(
+        "--reindex",
+        action="store_true",
+        help="Rebuild the players ivfflat index (lists sized from row count) and the "
+             "news HNSW index in the NEWS_VECTOR_STORAGE format"
+    )
     args = parser.parse_args()
 
     engine = get_engine(echo=args.echo_sql)
@@ -717,6 +1413,16 @@ def main():
         ingest_news(engine, verbose=args.verbose)
         link_player_news(engine)
 
+    if args.archive_news_months is not None:
+        archive_news(engine, args.archive_news_months, archive=not args.no_archive)
+
+    if args.reindex:
+        prepare_pgvector(engine)
+        build_player_vector_index(engine)
+        ensure_news_vector_index(engine)
+        refresh_player_neighbors(engine)
+        bump_data_version(engine, "players")
+
     print("✅ All done")
 
 